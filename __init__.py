@@ -22,9 +22,16 @@ bl_info = {
     "category" : "Mesh"
 }
 
-from . import auto_load
+try:
+    import bpy
+except ImportError:
+    # Imported outside Blender (kernel worker processes, CI): only the bpy-free modules are usable.
+    bpy = None
 
-auto_load.init()
+if bpy is not None:
+    from . import auto_load
+
+    auto_load.init()
 
 def register():
     auto_load.register()
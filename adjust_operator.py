@@ -18,106 +18,11 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import bpy
-from mathutils import Vector, Quaternion
 import math
 
-from . import selection
-
-# There's one somewhat annoying limitation here, which is that it mostly assumes mostly simple quad modeling.
-# That works ok for my use case, but it might be interesting to extend this to more complicated models.
-
-class AdjustState:
-    """Stores and answers questions about the state of the mesh for the adjustment."""
-    def __init__(self, mesh, selected_edges):
-        self.mesh = mesh
-        self.affected_loops = set()
-        self.affected_vertices = set()
-        self.selected_edges = selected_edges
-        for e in selected_edges:
-            edge = self.mesh.edges[e]
-            self.affected_vertices.add(edge.vertices[0])
-            self.affected_vertices.add(edge.vertices[1])
-
-    def set_loop_normal(self, loop, normal):
-        loop.normal = normal
-        self.affected_loops.add(loop.index)
-
-    def should_affect_loop(self, loop):
-        return loop.vertex_index in self.affected_vertices
-
-    def get_connected_polygons(self, vertex_id):
-        """Returns all MeshPolygon objects in this mesh that have vertex_id as a vertex"""
-        connected = list()
-        for p in self.mesh.polygons:
-            if vertex_id in p.vertices:
-                connected.append(p)
-        return connected
-    
-    def get_influential_polygons(self, poly, loop):
-        """Return all polygons that should influence the normal of a given loop.  This means they're connected to the same vertex and share a selected edge."""
-        connected = [p for p in self.get_connected_polygons(loop.vertex_index) if p != poly]
-        influential = [p for p in connected if self.shares_selected_edge(poly, p)]
-        return influential
-
-    def shares_selected_edge(self, poly_a, poly_b):
-        """Returns True if two polygons share an edge that is in the selected edge set."""
-        for e in self.get_shared_edges(poly_a, poly_b):
-            if e in self.selected_edges:
-                return True
-        return False
-    
-    def get_shared_edges(self, poly_a, poly_b):
-        """Gets a list of edge indices shared by two polygons"""
-        a_edges = set([self.mesh.loops[l].edge_index for l in poly_a.loop_indices])
-        return [self.mesh.loops[l].edge_index for l in poly_b.loop_indices if self.mesh.loops[l].edge_index in a_edges]
-    
-    def should_smooth(self, poly_a, poly_b):
-        """Given two polygons, figure out if their shared edge should have its normals smoothed or split."""
-        p1 = self.mesh.polygons[poly_a]
-        p2 = self.mesh.polygons[poly_b]
-
-        shared = self.get_shared_edges(p1, p2)
-        if len(shared) == 0:
-            return False
-        
-        # This might not work in some cases, so... those strange cases aren't supported.
-        edge_id = shared[0]
-        edge = self.mesh.edges[edge_id]
-
-        if edge_id in self.selected_edges:
-            return False
-        if edge.use_edge_sharp:
-            return False
-        
-        angle = p1.normal.angle(p2.normal)
-        return angle < self.mesh.auto_smooth_angle
-
-    def get_smooth_adjacent(self, candidates, poly_id):
-        """Given a list of candidate polygons, return any that are adjacent to poly_id and should be smoothed."""
-        ret = list()
-        for p in candidates:
-            if p == poly_id:
-                continue
-            if self.should_smooth(poly_id, p):
-                ret.append(p)
-        return ret
-    
-    
-    def get_smooth_set(self, candidates, poly_id):
-        """Given a list of candidate polygons, return a set of polygons that should have its normals smoothed with that poly_id"""
-        smooth = set([poly_id])
-        remaining = list([poly_id])
-        while len(remaining) > 0:
-            p = remaining.pop()
-            new = self.get_smooth_adjacent(candidates, p)
-            for n in new:
-                if n not in smooth:
-                    remaining.append(n)
-                    smooth.add(n)
-
-        return smooth
-    
+import bpy
+
+from . import profile_operator
 
 def get_mesh(context):
     obj = context.active_object
@@ -131,92 +36,236 @@ def get_seams(mesh):
 def get_edge_set(edges):
     return set([e.index for e in edges])
 
-def adjust_loop(state, this_poly, loop):
-    """Adjust the split normal of a given loop."""
-    normals = list()
-    rotations = list()
-
-    # Only adjust loops associated with affected vertices
-    if not state.should_affect_loop(loop):
-        return
-
-    # Start with the existing normal
-    new_normal = Vector(loop.normal)
-
-    # For each influential polygon, rotate the normal so that the resulting
-    # angle will be 90deg.
-    for that_poly in state.get_influential_polygons(this_poly, loop):
-        # Get the total angle between the polygons
-        angle = this_poly.normal.angle(that_poly.normal)
-        # We want a 90 degree difference between them
-        angle -= (math.pi / 2)
-        # ... and this loop should rotate to cover half the delta 
-        angle /= 2
-
-        axis = this_poly.normal.cross(that_poly.normal).normalized() 
-        #axis = loop.normal.cross(that_poly.normal).normalized() 
-        new_normal.rotate(Quaternion(axis, angle))
-
-    state.set_loop_normal(loop, new_normal)
-
-def smooth_normals(state):
-    """Average out normals for loops that should be smooth shaded"""
-
-    # The previous steps may have left split normals across edges that should be smooth shaded.
-    # This smooths them back out.
-
-    for vertex_id in state.affected_vertices:
-        connected = [p.index for p in state.get_connected_polygons(vertex_id)]
-
-        seen = set()
-        for poly in connected:
-            if poly in seen:
-                continue
-            smooth_set = state.get_smooth_set(connected, poly)
-
-            loops = list()
-            for poly in smooth_set:
-                seen.add(poly)
-                for l in state.mesh.polygons[poly].loop_indices:
-                    loop = state.mesh.loops[l]
-                    if loop.vertex_index == vertex_id:        
-                        loops.append(state.mesh.loops[l])
-
-            averaged = Vector()
-            for loop in loops:
-                averaged += loop.normal
-            averaged /= len(loop.normal)
-            for loop in loops:
-                state.set_loop_normal(loop, averaged)
-
-
-class TrimNormalsAdjustOperator(bpy.types.Operator):
+
+# Result cache hits and misses this session, for the operator report.
+result_cache_stats = {'hits': 0, 'misses': 0}
+
+# Topology, selection and edge classification of recently adjusted meshes, so redo panel tweaks
+# only rerun the rotation and smoothing. Created on first use, along with the kernel import.
+prepared_cache = None
+
+def get_prepared_cache():
+    global prepared_cache
+    if prepared_cache is None:
+        from . import kernel
+        prepared_cache = kernel.PreparedCache()
+    return prepared_cache
+
+# Per-edge dihedral angles and rotation axes of recently adjusted meshes, reused by every run until
+# their geometry changes.
+geometry_cache = None
+
+def get_geometry_cache():
+    global geometry_cache
+    if geometry_cache is None:
+        from . import kernel
+        geometry_cache = kernel.GeometryCache()
+    return geometry_cache
+
+class AdjustSettings:
+    """Properties and drawing shared by the adjust operators."""
+    engine: bpy.props.EnumProperty(
+        name="Engine",
+        description="Implementation used to compute the adjusted normals",
+        items=[
+            ('NUMPY', "NumPy", "Vectorized engine working on flat mesh arrays"),
+            ('PYTHON', "Python", "Per-loop reference engine, useful for comparing results"),
+        ],
+        default='NUMPY',
+    )
+
+    target_angle: bpy.props.FloatProperty(
+        name="Target Angle",
+        description="Angle the normals on either side of a trim edge end up apart",
+        subtype='ANGLE',
+        min=0.0,
+        max=math.pi,
+        default=math.pi / 2,
+    )
+
+    rotation_weight: bpy.props.FloatProperty(
+        name="Rotation Weight",
+        description="Share of the difference to the target angle each side of a trim edge rotates",
+        subtype='FACTOR',
+        min=0.0,
+        max=1.0,
+        default=0.5,
+    )
+
+    use_auto_smooth_angle: bpy.props.BoolProperty(
+        name="Use Auto Smooth Angle",
+        description="Smooth across edges below the mesh's auto smooth angle",
+        default=True,
+    )
+
+    smooth_angle: bpy.props.FloatProperty(
+        name="Smoothing Threshold",
+        description="Edges whose polygons meet below this angle are smoothed across",
+        subtype='ANGLE',
+        min=0.0,
+        max=math.pi,
+        default=math.radians(30),
+    )
+
+    merge: bpy.props.BoolProperty(
+        name="Keep Other Custom Normals",
+        description="Only write the loops the adjustment affects, keeping custom normals elsewhere instead of clearing them",
+        default=True,
+    )
+
+    chunk_workers: bpy.props.IntProperty(
+        name="Workers",
+        description="Number of chunks processed in parallel, sharing the memory budget",
+        min=1,
+        max=64,
+        default=1,
+    )
+
+    def get_params(self):
+        from . import kernel
+        return kernel.AdjustParams(self.target_angle, self.rotation_weight,
+                                   None if self.use_auto_smooth_angle else self.smooth_angle)
+
+    def draw_params(self, layout):
+        layout.prop(self, "target_angle")
+        layout.prop(self, "rotation_weight")
+        layout.prop(self, "use_auto_smooth_angle")
+        row = layout.row()
+        row.enabled = not self.use_auto_smooth_angle
+        row.prop(self, "smooth_angle")
+
+def read_adjust_input(context, clear, profile):
+    """Reads the active mesh for an adjustment, clearing its custom normals first if asked to.
+
+    Returns the mesh, its MeshData, the existing custom normals (or None) and the selected edges."""
+    from . import mesh_io
+    if clear:
+        with profile.phase("clear"):
+            bpy.ops.mesh.customdata_custom_splitnormals_clear()
+    with profile.phase("mode switch"):
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    with profile.phase("calc_normals_split"):
+        mesh = get_mesh(context);
+        mesh.use_auto_smooth = True
+
+    with profile.phase("read"):
+        data = mesh_io.read_mesh(mesh)
+        existing = None
+        if mesh.has_custom_normals:
+            # Split normals now include the existing custom normals; the kernel rebuilds the
+            # automatic ones it starts from, only around the affected vertices.
+            existing = data.loop_normal
+            data.loop_normal = None
+        selected = mesh_io.read_selected_edges(mesh)
+    return mesh, data, existing, selected
+
+def write_adjust_result(mesh, existing, normals, profile):
+    """Writes adjusted normals, keeping existing custom normals outside the adjusted loops."""
+    from . import kernel, mesh_io
+    with profile.phase("custom set"):
+        written = normals
+        if existing is not None:
+            written = kernel.merge_custom_normals(existing, normals, mesh_io.read_previous_normals(mesh))
+        mesh_io.write_custom_normals(mesh, written)
+
+class TrimNormalsAdjustOperator(AdjustSettings, bpy.types.Operator):
     bl_idname = 'opr.trim_normals_adjust_operator'
     bl_label = 'Adjust Trim Normals'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    incremental: bpy.props.BoolProperty(
+        name="Incremental",
+        description="Reuse the previous run's normals and only recompute around edges whose selection changed",
+        default=True,
+    )
+
+    use_result_cache: bpy.props.BoolProperty(
+        name="Reuse Stored Result",
+        description="Reapply the normals stored on the mesh when geometry, selection and settings match the run that stored them",
+        default=True,
+    )
+
+    memory_budget: bpy.props.IntProperty(
+        name="Memory Budget",
+        description="Process the mesh in chunks using at most this many megabytes at a time. 0 processes the whole mesh at once",
+        subtype='UNSIGNED',
+        min=0,
+        default=0,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "engine")
+        layout.prop(self, "incremental")
+        layout.prop(self, "use_result_cache")
+        layout.prop(self, "merge")
+        self.draw_params(layout)
+        layout.prop(self, "memory_budget")
+        row = layout.row()
+        row.enabled = self.memory_budget > 0
+        row.prop(self, "chunk_workers")
 
     def execute(self, context):
+        # NumPy and the kernel load on first use rather than with the add-on.
+        from . import kernel, mesh_io
+        prepared_cache = get_prepared_cache()
+        profile = profile_operator.begin_profile(context, self.bl_label)
         mode = context.active_object.mode
         try:
-            bpy.ops.mesh.customdata_custom_splitnormals_clear()
-            bpy.ops.object.mode_set(mode='OBJECT')
-
-            mesh = get_mesh(context);
-            mesh.use_auto_smooth = True
-
-            state = AdjustState(mesh, get_edge_set([e for e in mesh.edges if e.select]))
-
-            for p in mesh.polygons:
-                for l in p.loop_indices:
-                    adjust_loop(state, p, state.mesh.loops[l])
-
-            smooth_normals(state)
-
-            normal_set = [l.normal if l.index in state.affected_loops else Vector() for l in mesh.loops]
-            mesh.normals_split_custom_set(normal_set)
+            mesh, data, existing, selected = read_adjust_input(context, not self.merge, profile)
+            with profile.phase("read"):
+                params = self.get_params()
+                # Hashing the mesh dominates, so it's done once and every key is derived from it.
+                mesh_signature = kernel.get_signature(data)
+                signature = kernel.extend_signature(mesh_signature, self.engine, params.key())
+                result_key = kernel.get_result_key(signature, selected)
+                cached = mesh_io.read_cached_result(mesh, result_key) if self.use_result_cache else None
+
+                prepared = None
+                previous = None
+                if cached is None:
+                    cache_key = kernel.PreparedCache.get_key(mesh_signature, selected)
+                    geometry = get_geometry_cache().get(mesh.name_full, cache_key[0], data.edge_count)
+                    # Prepared adjustments hold the whole working set, which chunking is there to avoid.
+                    use_prepared = self.engine == 'NUMPY' and self.memory_budget == 0
+                    prepared = prepared_cache.lookup(mesh.name_full, cache_key) if use_prepared else None
+                    if prepared is None and self.incremental:
+                        previous = mesh_io.read_previous_run(mesh, signature)
+
+            if self.use_result_cache:
+                result_cache_stats['hits' if cached is not None else 'misses'] += 1
+                profile.count("result cache hits", cached is not None)
+                self.report({'INFO'}, "Stored result {} ({} hits, {} misses this session)".format(
+                    "reused" if cached is not None else "out of date",
+                    result_cache_stats['hits'], result_cache_stats['misses']))
+
+            if cached is not None:
+                normals = cached
+            elif prepared is not None:
+                normals = prepared.compute(params, profile)
+            elif previous is not None:
+                normals, dirty = kernel.update_normals(data, selected, *previous, engine=self.engine, params=params, profile=profile,
+                                                      geometry=geometry, memory_budget=self.memory_budget << 20,
+                                                      workers=self.chunk_workers)
+                self.report({'INFO'}, "Recomputed {} of {} vertices".format(int(dirty.sum()), data.vertex_count))
+            elif self.memory_budget > 0:
+                normals = kernel.compute_normals_chunked(data, selected, self.engine, params, self.memory_budget << 20,
+                                                         self.chunk_workers, profile, geometry=geometry)
+            elif self.engine == 'NUMPY':
+                prepared = kernel.PreparedAdjust(data, selected, profile=profile, geometry=geometry)
+                prepared_cache.store(mesh.name_full, cache_key, prepared)
+                normals = prepared.compute(params, profile)
+            else:
+                normals = kernel.compute_normals(data, selected, self.engine, params=params, profile=profile, geometry=geometry)
+
+            write_adjust_result(mesh, existing, normals, profile)
+            if cached is None:
+                with profile.phase("store"):
+                    mesh_io.store_run(mesh, signature, selected, normals, result_key)
         finally:
-            bpy.ops.object.mode_set(mode=mode)
+            with profile.phase("mode switch"):
+                bpy.ops.object.mode_set(mode=mode)
+            profile_operator.end_profile(self, context, profile)
 
         return { 'FINISHED' }
-    
-
-    
\ No newline at end of file
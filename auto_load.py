@@ -14,6 +14,7 @@
 import os
 import bpy
 import sys
+import json
 import typing
 import inspect
 import pkgutil
@@ -35,8 +36,16 @@ def init():
     global modules
     global ordered_classes
 
-    modules = get_all_submodules(Path(__file__).parent)
+    directory = Path(__file__).parent
+    cache_key = get_cache_key(directory)
+    cached = load_cached_order(directory, cache_key)
+    if cached is not None:
+        modules, ordered_classes = cached
+        return
+
+    modules = get_all_submodules(directory)
     ordered_classes = get_ordered_classes_to_register(modules)
+    save_cached_order(directory, cache_key, modules, ordered_classes)
 
 def register():
     for cls in ordered_classes:
@@ -79,6 +88,62 @@ def iter_submodule_names(path, root=""):
             yield root + module_name
 
 
+# Cache the registration order
+#################################################
+
+# Resolving the order imports every submodule and inspects every class. The result only changes when
+# the add-on's files or Blender do, so it's cached, and startup then imports just the modules that
+# register something. Modules without classes (the NumPy kernel and friends) load on first use.
+
+def get_cache_path(directory):
+    return directory / "__pycache__" / "auto_load_order.json"
+
+def get_cache_key(directory):
+    files = {str(path.relative_to(directory)): path.stat().st_mtime_ns for path in sorted(directory.rglob("*.py"))}
+    package = sys.modules[directory.name]
+    return {
+        "blender": list(blender_version),
+        "version": list(getattr(package, "bl_info", {}).get("version", ())),
+        "files": files,
+    }
+
+def load_cached_order(directory, cache_key):
+    try:
+        with open(get_cache_path(directory), "r") as f:
+            cache = json.load(f)
+        if cache["key"] != cache_key:
+            return None
+        cached_modules = [importlib.import_module("." + name, directory.name) for name in cache["modules"]]
+        classes = [get_class(module, name) for module, name in cache["classes"]]
+    except (OSError, ValueError, KeyError, ImportError, AttributeError):
+        return None
+    return cached_modules, classes
+
+def get_class(module_name, qualname):
+    value = sys.modules[module_name]
+    for part in qualname.split("."):
+        value = getattr(value, part)
+    return value
+
+def save_cached_order(directory, cache_key, modules, classes):
+    class_modules = set(cls.__module__ for cls in classes)
+    cache = {
+        "key": cache_key,
+        "modules": [module.__name__[len(directory.name) + 1:] for module in modules
+                    if module.__name__ != __name__ and
+                    (module.__name__ in class_modules or hasattr(module, "register") or hasattr(module, "unregister"))],
+        "classes": [(cls.__module__, cls.__qualname__) for cls in classes],
+    }
+    # The add-on may be installed somewhere read only; it then just resolves the order every time.
+    try:
+        path = get_cache_path(directory)
+        path.parent.mkdir(exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+
 # Find classes to register
 #################################################
 
@@ -0,0 +1,216 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# Adjusting big meshes without blocking the UI: the mesh is read into arrays up front, the kernel runs on a
+# worker thread one chunk at a time, and a modal timer polls it, reporting progress until it's done. Only the
+# thread touches the arrays while it runs; bpy is only used from the main thread.
+
+import threading
+
+import bpy
+
+from . import adjust_operator
+from . import profile_operator
+from . import profiling
+
+# Chunk budget when the operator's is left at 0; small enough to report progress every few percent on big meshes.
+DEFAULT_MEMORY_BUDGET = 256
+
+# Seconds between progress checks.
+POLL_INTERVAL = 0.1
+
+# Running jobs by object name, for the panel.
+jobs = dict()
+
+class AdjustJob:
+    """A kernel run on a worker thread. Progress and cancellation go through plain attributes,
+    which is all the main thread reads and writes while the thread runs."""
+    def __init__(self, data, selected, engine, params, memory_budget, workers, profile, geometry=None):
+        self.done = 0
+        self.total = 0
+        self.cancelled = False
+        self.normals = None
+        self.error = None
+        self.args = (data, selected, engine, params, memory_budget, workers, profile, geometry)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        """Runs the kernel, on the worker thread, or directly when the operator executes without invoking."""
+        from . import kernel
+        data, selected, engine, params, memory_budget, workers, profile, geometry = self.args
+        try:
+            with profile.phase("compute"):
+                self.normals = kernel.compute_normals_chunked(data, selected, engine, params, memory_budget, workers,
+                                                              profile, self.update, geometry)
+        except Exception as error:
+            self.error = error
+
+    def update(self, done, total):
+        self.done = done
+        self.total = total
+        return not self.cancelled
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total > 0 else 0.0
+
+    @property
+    def finished(self):
+        return not self.thread.is_alive()
+
+def tag_redraw(context):
+    for area in context.screen.areas:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
+class TrimNormalsBackgroundAdjustOperator(adjust_operator.AdjustSettings, bpy.types.Operator):
+    bl_idname = 'opr.trim_normals_background_adjust'
+    bl_label = 'Adjust Trim Normals in Background'
+    bl_description = 'Adjust the normals on a worker thread, keeping the viewport usable. Esc cancels'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    memory_budget: bpy.props.IntProperty(
+        name="Memory Budget",
+        description="Megabytes each chunk may use. 0 uses a default that still reports progress regularly",
+        subtype='UNSIGNED',
+        min=0,
+        default=0,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and obj.name not in jobs
+
+    def start_job(self, context):
+        """Snapshots the active mesh into a new AdjustJob, which isn't started yet."""
+        from . import kernel
+        obj = context.active_object
+        # cProfile only follows the thread that enables it, so background runs are timed by phase only.
+        self.profile = profiling.Profile(self.bl_label).start()
+        mode = obj.mode
+        try:
+            with self.profile.phase("snapshot"):
+                # Nothing is cleared up front, so cancelling leaves the mesh as it was. Without merging,
+                # apply writes zero (automatic) normals outside the adjusted loops instead.
+                mesh, data, existing, selected = adjust_operator.read_adjust_input(context, False, self.profile)
+                params = self.get_params()
+                mesh_signature = kernel.get_signature(data)
+                self.signature = kernel.extend_signature(mesh_signature, self.engine, params.key())
+                geometry = adjust_operator.get_geometry_cache().get(mesh.name_full, mesh_signature, data.edge_count)
+        finally:
+            bpy.ops.object.mode_set(mode=mode)
+
+        self.object_name = obj.name
+        self.existing = existing if self.merge else None
+        self.selected = selected
+        self.job = AdjustJob(data, selected, self.engine, params, (self.memory_budget or DEFAULT_MEMORY_BUDGET) << 20,
+                             self.chunk_workers, self.profile, geometry)
+
+    def execute(self, context):
+        # Scripts and Redo Last run the job right here, without the modal progress.
+        self.start_job(context)
+        self.job.run()
+        if self.job.error is not None:
+            self.report({'ERROR'}, "Trim normals adjustment failed: {}".format(self.job.error))
+            result = { 'CANCELLED' }
+        else:
+            result = self.apply(context)
+        profile_operator.end_profile(self, context, self.profile)
+        return result
+
+    def invoke(self, context, event):
+        self.start_job(context)
+        jobs[self.object_name] = self.job
+        self.job.thread.start()
+
+        self.timer = context.window_manager.event_timer_add(POLL_INTERVAL, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return { 'RUNNING_MODAL' }
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self.job.cancelled = True
+            self.job.thread.join()
+            self.report({'INFO'}, "Trim normals adjustment cancelled")
+            return self.finish(context, { 'CANCELLED' })
+
+        if event.type != 'TIMER':
+            # Leave everything else to the viewport, so it can still be navigated.
+            return { 'PASS_THROUGH' }
+
+        if not self.job.finished:
+            context.workspace.status_text_set("Adjusting trim normals on {}: {:.0%} (Esc to cancel)".format(
+                self.object_name, self.job.progress))
+            tag_redraw(context)
+            return { 'RUNNING_MODAL' }
+
+        if self.job.error is not None:
+            self.report({'ERROR'}, "Trim normals adjustment failed: {}".format(self.job.error))
+            return self.finish(context, { 'CANCELLED' })
+        return self.finish(context, self.apply(context))
+
+    def cancel(self, context):
+        # Blender is closing the operator down, e.g. on loading another file.
+        self.job.cancelled = True
+        self.job.thread.join()
+        self.finish(context, { 'CANCELLED' })
+
+    def apply(self, context):
+        """Writes the finished job's normals, if the mesh still matches the snapshot it started from."""
+        from . import kernel, mesh_io
+        obj = bpy.data.objects.get(self.object_name)
+        if obj is None or obj.type != 'MESH':
+            self.report({'WARNING'}, "{} was removed while its normals were adjusted".format(self.object_name))
+            return { 'CANCELLED' }
+
+        mode = obj.mode
+        if mode != 'OBJECT' and obj != context.active_object:
+            self.report({'WARNING'}, "Make {} active or leave its Edit Mode to apply its adjusted normals".format(
+                self.object_name))
+            return { 'CANCELLED' }
+        try:
+            if mode != 'OBJECT':
+                with self.profile.phase("mode switch"):
+                    bpy.ops.object.mode_set(mode='OBJECT')
+            with self.profile.phase("apply"):
+                mesh = obj.data
+                mesh.calc_normals_split()
+                mesh.use_auto_smooth = True
+                data = mesh_io.read_mesh(mesh)
+                if kernel.get_signature(data, self.engine, self.get_params().key()) != self.signature:
+                    self.report({'WARNING'}, "{} changed while its normals were adjusted; run the adjustment again".format(
+                        self.object_name))
+                    return { 'CANCELLED' }
+                adjust_operator.write_adjust_result(mesh, self.existing, self.job.normals, self.profile)
+                mesh_io.store_run(mesh, self.signature, self.selected, self.job.normals,
+                                  kernel.get_result_key(self.signature, self.selected))
+        finally:
+            if mode != 'OBJECT':
+                bpy.ops.object.mode_set(mode=mode)
+        self.report({'INFO'}, "Adjusted trim normals on {}".format(self.object_name))
+        return { 'FINISHED' }
+
+    def finish(self, context, result):
+        context.window_manager.event_timer_remove(self.timer)
+        context.workspace.status_text_set(None)
+        jobs.pop(self.object_name, None)
+        tag_redraw(context)
+        profile_operator.end_profile(self, context, self.profile)
+        return result
@@ -0,0 +1,187 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+import bpy
+import os
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+from . import adjust_operator
+from .profiling import NULL_PROFILE
+
+def iter_instanced_objects(objects, seen):
+    """Yields objects and, recursively, the objects of collections they instance, once each."""
+    for obj in objects:
+        if obj in seen:
+            continue
+        seen.add(obj)
+        yield obj
+        if obj.instance_type == 'COLLECTION' and obj.instance_collection is not None:
+            yield from iter_instanced_objects(obj.instance_collection.all_objects, seen)
+
+def get_batch_objects(context, targets='SELECTED'):
+    """Returns the mesh objects to adjust: the selected ones, or every one in the scene, including those
+    only reached through collection instances."""
+    if targets == 'SCENE':
+        objects = iter_instanced_objects(context.scene.objects, set())
+    else:
+        objects = context.selected_objects
+    return [o for o in objects if o.type == 'MESH']
+
+def group_batch_jobs(jobs, signatures):
+    """Groups meshes whose jobs give the same result: same geometry (their get_signature in signatures)
+    and the same trim selection.
+
+    Returns a dict from result key to (job, meshes)."""
+    from . import kernel
+    groups = dict()
+    for mesh, (data, selected) in jobs.items():
+        key = kernel.get_result_key(signatures[mesh], selected)
+        if key in groups:
+            groups[key][1].append(mesh)
+        else:
+            groups[key] = ((data, selected), [mesh])
+    return groups
+
+def read_batch_job(mesh):
+    """Snapshot one mesh into plain arrays. Must run on the main thread.
+
+    Returns the job's (MeshData, selected edges) and the mesh's existing custom normals, or None. Meshes
+    without selected edges have nothing to adjust, so they're left untouched and give (None, None)."""
+    from . import mesh_io
+    selected = mesh_io.read_selected_edges(mesh)
+    if not selected.any():
+        return None, None
+    mesh.use_auto_smooth = True
+    mesh.calc_normals_split()
+    data = mesh_io.read_mesh(mesh)
+    existing = None
+    if mesh.has_custom_normals:
+        # As in read_adjust_input, the kernel rebuilds the automatic normals it starts from.
+        existing = data.loop_normal
+        data.loop_normal = None
+    return (data, selected), existing
+
+def get_executor(kind, workers):
+    if kind == 'PROCESS':
+        # The kernel doesn't import bpy, so spawned workers only need numpy and this package on sys.path.
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return ThreadPoolExecutor(max_workers=workers)
+
+class TrimNormalsBatchAdjustOperator(bpy.types.Operator):
+    bl_idname = 'opr.trim_normals_batch_adjust_operator'
+    bl_label = 'Batch Adjust Selected'
+    bl_description = 'Adjust trim normals on every selected mesh object, using each mesh\'s selected edges. Meshes shared by several objects, or identical in geometry and trim selection, are only computed once'
+
+    targets: bpy.props.EnumProperty(
+        name="Targets",
+        description="Objects whose meshes are adjusted",
+        items=[
+            ('SELECTED', "Selected", "The selected mesh objects"),
+            ('SCENE', "Scene", "Every mesh object in the scene, including those in instanced collections"),
+        ],
+        default='SELECTED',
+    )
+
+    workers: bpy.props.IntProperty(
+        name="Workers",
+        description="Number of workers, 0 to use one per CPU",
+        default=0,
+        min=0,
+    )
+
+    executor: bpy.props.EnumProperty(
+        name="Executor",
+        description="Where the adjustment kernel runs",
+        items=[
+            ('THREAD', "Threads", "Run in worker threads; cheap to start, NumPy releases the GIL for most of the work"),
+            ('PROCESS', "Processes", "Run in worker processes; pays for pickling the mesh arrays but scales past the GIL"),
+        ],
+        default='THREAD',
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene is not None
+
+    def execute(self, context):
+        from . import kernel, mesh_io
+        start = time.perf_counter()
+        mode = context.active_object.mode if context.active_object else 'OBJECT'
+        objects = get_batch_objects(context, self.targets)
+        # Linked meshes can't be written to.
+        linked = [o for o in objects if o.data.library is not None]
+        objects = [o for o in objects if o.data.library is None]
+        if len(objects) == 0:
+            self.report({'WARNING'}, "No editable mesh objects to adjust")
+            return { 'CANCELLED' }
+        wm = context.window_manager
+        workers = self.workers or os.cpu_count() or 1
+
+        try:
+            if mode != 'OBJECT':
+                bpy.ops.object.mode_set(mode='OBJECT')
+
+            # Meshes can only be read and written on the main thread; only the kernel runs in the pool.
+            # Objects sharing a mesh datablock share its job, and identical meshes share one computation.
+            jobs = dict()
+            existing = dict()
+            for mesh in dict.fromkeys(o.data for o in objects):
+                job, normals = read_batch_job(mesh)
+                if job is not None:
+                    jobs[mesh] = job
+                    existing[mesh] = normals
+            unselected = [o for o in objects if o.data not in jobs]
+            objects = [o for o in objects if o.data in jobs]
+            signatures = {mesh: kernel.get_signature(data) for mesh, (data, _) in jobs.items()}
+            groups = group_batch_jobs(jobs, signatures)
+            # Batch runs use the default engine and parameters.
+            params_key = kernel.AdjustParams().key()
+
+            wm.progress_begin(0, len(groups))
+            try:
+                with get_executor(self.executor, workers) as pool:
+                    futures = {pool.submit(kernel.compute_normals, *job): meshes for job, meshes in groups.values()}
+                    for done, future in enumerate(as_completed(futures)):
+                        normals = future.result()
+                        for mesh in futures[future]:
+                            # Custom normals outside the adjusted loops stay as they were.
+                            adjust_operator.write_adjust_result(mesh, existing[mesh], normals, NULL_PROFILE)
+                            # Stored like the adjust operator's runs, so its next merge, incremental
+                            # update or result cache lookup starts from this one.
+                            signature = kernel.extend_signature(signatures[mesh], 'NUMPY', params_key)
+                            selected = jobs[mesh][1]
+                            mesh_io.store_run(mesh, signature, selected, normals, kernel.get_result_key(signature, selected))
+                        wm.progress_update(done + 1)
+            finally:
+                wm.progress_end()
+        finally:
+            if mode != 'OBJECT':
+                bpy.ops.object.mode_set(mode=mode)
+
+        self.report({'INFO'}, "Adjusted {} objects ({} meshes) with {} computations, saving {}, using {} workers in {:.2f}s".format(
+            len(objects), len(jobs), len(groups), len(objects) - len(groups), workers, time.perf_counter() - start))
+        if unselected:
+            self.report({'INFO'}, "Skipped {} objects without selected edges".format(len(unselected)))
+        if linked:
+            self.report({'WARNING'}, "Skipped {} objects with linked meshes".format(len(linked)))
+        return { 'FINISHED' }
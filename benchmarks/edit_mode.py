@@ -0,0 +1,94 @@
+# Times reading an INT edge attribute and the UV map from Edit Mode, the ways the selection operators could
+# do it, on a grid of about a million edges and two million loops. Unlike run.py this needs Blender, or the bpy module:
+#
+#   blender --background --factory-startup --python benchmarks/edit_mode.py
+#
+# "copy" is mesh_io.read_edge_layer and read_loop_uvs: update_from_editmode, then foreach_get on a temporary
+# copy of the mesh. "bmesh" syncs the same way, then makes one Python pass over the BMesh edges or loops.
+# "mode switch" leaves Edit Mode, reads with foreach_get and enters Edit Mode again.
+
+import importlib
+import math
+import sys
+import time
+from pathlib import Path
+
+import bpy
+import bmesh  # After bpy, which provides it when running as the bpy module
+import numpy as np
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_DIR.parent))
+mesh_io = importlib.import_module(PACKAGE_DIR.name + ".mesh_io")
+
+ATTRIBUTE = 'trimsheet_bench'
+SUBDIVISIONS = 708
+REPEAT = 3
+
+def read_copy(obj):
+    mesh_io.sync_edit_mesh(obj)
+    return mesh_io.read_edge_layer(obj, ATTRIBUTE)
+
+def read_bmesh(obj):
+    mesh_io.sync_edit_mesh(obj)
+    bm = bmesh.from_edit_mesh(obj.data)
+    layer = bm.edges.layers.int.get(ATTRIBUTE)
+    return np.fromiter((e[layer] for e in bm.edges), dtype=np.int32, count=len(bm.edges))
+
+def read_mode_switch(obj):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    values = mesh_io.read_edge_layer(obj, ATTRIBUTE)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return values
+
+def read_uvs_copy(obj):
+    mesh_io.sync_edit_mesh(obj)
+    return mesh_io.read_loop_uvs(obj)
+
+def read_uvs_bmesh(obj):
+    mesh_io.sync_edit_mesh(obj)
+    bm = bmesh.from_edit_mesh(obj.data)
+    layer = bm.loops.layers.uv.active
+    # Mesh loops follow BMesh faces, each face's loops starting from its first.
+    uvs = np.fromiter((c for f in bm.faces for l in f.loops for c in l[layer].uv), dtype=np.float32,
+                      count=2 * len(obj.data.loops))
+    return uvs.reshape(-1, 2)
+
+def read_uvs_mode_switch(obj):
+    bpy.ops.object.mode_set(mode='OBJECT')
+    values = mesh_io.read_loop_uvs(obj)
+    bpy.ops.object.mode_set(mode='EDIT')
+    return values
+
+def best_of(function, obj):
+    best = math.inf
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = function(obj)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def run(title, obj, expected, functions):
+    print(title)
+    for name, function in functions:
+        seconds, values = best_of(function, obj)
+        if not np.array_equal(values, expected):
+            print("{} read the wrong values".format(name), file=sys.stderr)
+            sys.exit(1)
+        print("  {:<12} {:10.3f} ms".format(name, seconds * 1000))
+
+def main():
+    bpy.ops.mesh.primitive_grid_add(x_subdivisions=SUBDIVISIONS, y_subdivisions=SUBDIVISIONS)
+    obj = bpy.context.active_object
+    expected = np.random.default_rng(0).integers(0, 1 << 31, len(obj.data.edges), dtype=np.int32)
+    mesh_io.get_attribute(obj.data, ATTRIBUTE, 'INT', 'EDGE').data.foreach_set("value", expected)
+    expected_uvs = mesh_io.read_loop_uvs(obj)
+    bpy.ops.object.mode_set(mode='EDIT')
+
+    run("Edge attribute, {} edges".format(len(expected)), obj, expected,
+        (("copy", read_copy), ("bmesh", read_bmesh), ("mode switch", read_mode_switch)))
+    run("UV map, {} loops".format(len(expected_uvs)), obj, expected_uvs,
+        (("copy", read_uvs_copy), ("bmesh", read_uvs_bmesh), ("mode switch", read_uvs_mode_switch)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Parametric trim sheet meshes for the benchmarks. Each is a 2D profile swept along a line or around an
+# axis, as quads; the edges running along the sweep from the profile's bevel points are the trim edges.
+
+import math
+
+import numpy as np
+
+class TrimMesh:
+    """Flat arrays for kernel.build_mesh_data, plus the trim edges as vertex index pairs."""
+    def __init__(self, vertex_co, poly_vertices, trim_pairs):
+        self.vertex_co = vertex_co
+        self.poly_vertices = poly_vertices
+        self.trim_pairs = trim_pairs
+
+    @property
+    def loop_vertex(self):
+        return self.poly_vertices.ravel()
+
+    @property
+    def poly_loop_total(self):
+        return np.full(len(self.poly_vertices), 4)
+
+    @property
+    def loop_count(self):
+        return self.poly_vertices.size
+
+def sweep(vertex_co, profile_count, path_count, trims, closed_profile, closed_path):
+    """Quads between a grid of profile_count x path_count vertices, laid out profile-major within each path step."""
+    profile = np.arange(profile_count if closed_profile else profile_count - 1)
+    path = np.arange(path_count if closed_path else path_count - 1)
+    i, s = np.meshgrid(profile, path, indexing="ij")
+    i = i.ravel()
+    s = s.ravel()
+    i_next = (i + 1) % profile_count
+    s_next = (s + 1) % path_count
+    polys = np.stack((s * profile_count + i, s * profile_count + i_next,
+                      s_next * profile_count + i_next, s_next * profile_count + i), axis=1)
+
+    trims = np.flatnonzero(trims)
+    t, s = np.meshgrid(trims, path, indexing="ij")
+    pairs = np.stack((s.ravel() * profile_count + t.ravel(), ((s.ravel() + 1) % path_count) * profile_count + t.ravel()), axis=1)
+    return TrimMesh(vertex_co, polys, pairs)
+
+def extrude(profile, trims, segments, length, closed_profile):
+    profile = np.asarray(profile, dtype=np.float64)
+    z = np.linspace(0.0, length, segments + 1)
+    vertex_co = np.concatenate((np.tile(profile, (segments + 1, 1)), np.repeat(z, len(profile))[:, None]), axis=1)
+    return sweep(vertex_co, len(profile), segments + 1, trims, closed_profile, False)
+
+def revolve(profile, trims, segments):
+    profile = np.asarray(profile, dtype=np.float64)
+    angles = np.linspace(0.0, 2 * math.pi, segments, endpoint=False)
+    radius = np.tile(profile[:, 0], segments)
+    height = np.tile(profile[:, 1], segments)
+    angle = np.repeat(angles, len(profile))
+    vertex_co = np.stack((radius * np.cos(angle), radius * np.sin(angle), height), axis=1)
+    return sweep(vertex_co, len(profile), segments, trims, False, True)
+
+def beveled_box(segments, size=1.0, bevel=0.1):
+    """A chamfered square tube; every chamfer boundary is a trim edge."""
+    s, b = size, bevel
+    profile = [(s, s - b), (s - b, s), (-s + b, s), (-s, s - b), (-s, -s + b), (-s + b, -s), (s - b, -s), (s, -s + b)]
+    return extrude(profile, [True] * 8, segments, 0.05 * segments, True)
+
+def beveled_cylinder(segments):
+    """A tube with a chamfered rim, revolved around z."""
+    profile = [(0.8, 0.0), (0.8, 0.95), (0.85, 1.0), (0.95, 1.0), (1.0, 0.95), (1.0, 0.0)]
+    return revolve(profile, [False, True, True, True, True, False], segments)
+
+def panel_strip(segments):
+    """A flat strip with a beveled groove running along it."""
+    profile = [(-1.0, 0.0), (-0.3, 0.0), (-0.25, -0.05), (0.25, -0.05), (0.3, 0.0), (1.0, 0.0)]
+    return extrude(profile, [False, True, True, True, True, False], segments, 0.05 * segments, False)
+
+def array(mesh, count, offset=(3.0, 0.0, 0.0)):
+    """count copies of mesh, offset from each other, as one mesh."""
+    vertex_count = len(mesh.vertex_co)
+    shift = np.arange(count)
+    vertex_co = np.concatenate([mesh.vertex_co + np.asarray(offset) * i for i in shift])
+    polys = np.concatenate([mesh.poly_vertices + vertex_count * i for i in shift])
+    pairs = np.concatenate([mesh.trim_pairs + vertex_count * i for i in shift])
+    return TrimMesh(vertex_co, polys, pairs)
+
+def limit_trims(mesh, count):
+    """Keeps only the first count trim edges, like fixing up a few bevels on a big mesh."""
+    return TrimMesh(mesh.vertex_co, mesh.poly_vertices, mesh.trim_pairs[:count])
+
+def for_loops(generator, loops):
+    """Calls generator(segments) with the number of segments that gets closest to the loop count."""
+    per_segment = generator(2).loop_count / 2
+    return generator(max(2, int(round(loops / per_segment))))
+
+CASES = {
+    'box': lambda loops: for_loops(beveled_box, loops),
+    'cylinder': lambda loops: for_loops(beveled_cylinder, loops),
+    'strip': lambda loops: for_loops(panel_strip, loops),
+    'cylinder_array': lambda loops: array(for_loops(beveled_cylinder, loops / 16), 16),
+    'strip_sparse': lambda loops: limit_trims(for_loops(panel_strip, loops), 20),
+}
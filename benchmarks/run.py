@@ -0,0 +1,238 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Times every stage of the adjust and selection operators on generated trim meshes, without Blender:
+#
+#   python benchmarks/run.py                 # compare against benchmarks/baseline.json
+#   python benchmarks/run.py --update        # record a new baseline
+#   python benchmarks/run.py --max-loops 50000
+#
+# The operators' bpy reads and writes are bulk foreach_get/foreach_set copies; everything between them runs
+# in the kernel, which is what's timed here. A stage fails the run when it's slower than its baseline by
+# more than --tolerance, ignoring differences under --noise seconds. Baselines are machine specific, so
+# record them on the machine (or CI runner type) that compares against them.
+#
+# Every stage that claims the same result as a full NumPy run is also checked against one, and any mismatch
+# fails the run, with or without --update.
+
+import argparse
+import importlib
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+import meshes
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PACKAGE_DIR.parent))
+kernel = importlib.import_module(PACKAGE_DIR.name + ".kernel")
+edge_masks = importlib.import_module(PACKAGE_DIR.name + ".edge_masks")
+profiling = importlib.import_module(PACKAGE_DIR.name + ".profiling")
+
+SIZES = [1_000, 30_000, 300_000, 2_000_000]
+# The per-loop reference engine only runs on meshes up to this size.
+PYTHON_ENGINE_LOOPS = 30_000
+# Chunked runs get a memory budget that splits the mesh into about this many chunks.
+CHUNKS = 8
+
+# Largest difference allowed between normal directions that should match, and between normals and their
+# octahedral round trip (see kernel.encode_normals).
+MATCH_TOLERANCE = 1e-6
+OCTAHEDRAL_TOLERANCE = 1e-4
+
+def get_trim_edges(data, pairs):
+    pairs = np.sort(pairs, axis=1)
+    keys = pairs[:, 0] * data.vertex_count + pairs[:, 1]
+    edge_keys = data.edge_vertices.min(axis=1) * data.vertex_count + data.edge_vertices.max(axis=1)
+    return np.isin(edge_keys, keys)
+
+def copy_mesh(data):
+    """A fresh MeshData without derived topology, like mesh_io.read_mesh returns on every run."""
+    return kernel.MeshData(data.vertex_co, data.edge_vertices, data.edge_sharp, data.loop_vertex, data.loop_edge,
+                           data.loop_normal, data.poly_loop_start, data.poly_loop_total, data.poly_normal,
+                           data.auto_smooth_angle, data.poly_smooth)
+
+def best_of(repeat, function):
+    """Runs function repeat times, returning the fastest time and the last result."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def best_profile(repeat, function):
+    """Runs function(profile) repeat times, returning the fastest time of each phase."""
+    phases = dict()
+    for _ in range(repeat):
+        profile = profiling.Profile("")
+        function(profile)
+        for name, seconds in profile.phases.items():
+            phases[name] = min(phases.get(name, math.inf), seconds)
+    return phases
+
+def get_directions(normals):
+    """Unit normals, zero where the adjustment left a loop alone. Custom normals are normalized when set, so
+    engines only need to agree on directions."""
+    normals = np.asarray(normals, dtype=np.float64)
+    lengths = np.linalg.norm(normals, axis=1)[:, None]
+    return np.where(lengths > 0, normals / np.where(lengths > 0, lengths, 1.0), 0.0)
+
+def get_error(normals, expected):
+    """Largest difference between the directions of two sets of normals, or infinity if one leaves a loop
+    alone and the other doesn't."""
+    normals = get_directions(normals)
+    expected = get_directions(expected)
+    if not np.array_equal(np.any(normals != 0, axis=1), np.any(expected != 0, axis=1)):
+        return math.inf
+    return float(np.abs(normals - expected).max(initial=0.0))
+
+def run_case(generate, loops, repeat):
+    """Returns the loop count, trim edge count, seconds per stage and (stage, error) mismatches."""
+    stages = dict()
+    mismatches = list()
+    def check(stage, normals, expected, tolerance=MATCH_TOLERANCE):
+        error = get_error(normals, expected)
+        if not error <= tolerance:
+            mismatches.append((stage, error))
+
+    mesh = generate(loops)
+
+    # Mesh reading and calc_normals_split.
+    stages["build"], data = best_of(1, lambda: kernel.build_mesh_data(
+        mesh.vertex_co, mesh.loop_vertex, mesh.poly_loop_total, math.radians(30)))
+    selected = get_trim_edges(data, mesh.trim_pairs)
+
+    # Adjust operator.
+    stages["signature"], signature = best_of(repeat, lambda: kernel.get_signature(data, 'NUMPY'))
+    stages["result key"], _ = best_of(repeat, lambda: kernel.get_result_key(signature, selected))
+    phases = best_profile(repeat, lambda profile: kernel.compute_normals(copy_mesh(data), selected, profile=profile))
+    stages.update(("adjust: " + name, seconds) for name, seconds in phases.items())
+    normals = kernel.compute_normals(copy_mesh(data), selected)
+
+    # Rerun with the edge geometry an earlier run on the same mesh left behind.
+    geometry = kernel.EdgeGeometry(data.edge_count)
+    kernel.compute_normals(copy_mesh(data), selected, geometry=geometry)
+    stages["reused geometry"], reused = best_of(repeat, lambda: kernel.compute_normals(copy_mesh(data), selected, geometry=geometry))
+    check("reused geometry", reused, normals)
+
+    budget = data.loop_count * kernel.WORKING_BYTES_PER_LOOP // CHUNKS
+    stages["chunked"], chunked = best_of(repeat, lambda: kernel.compute_normals_chunked(copy_mesh(data), selected,
+                                                                                        memory_budget=budget))
+    check("chunked", chunked, normals)
+
+    prepared = kernel.PreparedAdjust(copy_mesh(data), selected)
+    params = kernel.AdjustParams(math.radians(80), 0.3)
+    stages["redo"], redone = best_of(repeat, lambda: prepared.compute(params))
+    check("redo", redone, kernel.compute_normals(copy_mesh(data), selected, params=params))
+
+    changed = selected.copy()
+    flip = np.flatnonzero(selected)[:10]
+    changed[flip] = False
+    stages["incremental"], (updated, _) = best_of(repeat, lambda: kernel.update_normals(copy_mesh(data), changed, selected, normals))
+    check("incremental", updated, kernel.compute_normals(copy_mesh(data), changed))
+
+    existing = np.zeros_like(normals)
+    stages["merge"], _ = best_of(repeat, lambda: kernel.merge_custom_normals(existing, normals, normals))
+    stages["encode"], packed = best_of(repeat, lambda: kernel.encode_normals(normals))
+    stages["decode"], decoded = best_of(repeat, lambda: kernel.decode_normals(packed))
+    check("encode/decode", decoded, normals, OCTAHEDRAL_TOLERANCE)
+
+    if data.loop_count <= PYTHON_ENGINE_LOOPS:
+        stages["python engine"], reference = best_of(repeat, lambda: kernel.compute_normals(copy_mesh(data), selected, 'PYTHON'))
+        check("python engine", reference, normals)
+
+    # Selection operators: combining masks, saving and restoring edge sets, and the vertex selection.
+    seams = np.zeros(data.edge_count, dtype=bool)
+    seams[::7] = True
+    stages["select combined"], _ = best_of(repeat, lambda: edge_masks.combine_masks([seams, data.edge_sharp, selected], data.edge_count))
+    words = np.zeros(data.edge_count, dtype=np.int32)
+    stages["save set"], words = best_of(repeat, lambda: edge_masks.write_set(words, 5, selected))
+    words = edge_masks.write_set(words, 6, seams)
+    stages["union sets"], _ = best_of(repeat, lambda: edge_masks.union(words, [5, 6]))
+    stages["intersect sets"], _ = best_of(repeat, lambda: edge_masks.intersect(words, [5, 6]))
+    stages["select vertices"], _ = best_of(repeat, lambda: edge_masks.get_vertex_mask(data.edge_vertices, selected, data.vertex_count))
+
+    return data.loop_count, int(selected.sum()), stages, mismatches
+
+def compare(results, baseline, tolerance, noise):
+    """Returns the (case, stage, baseline, current) stages that got slower."""
+    regressions = list()
+    for case, stages in results.items():
+        for stage, seconds in stages.items():
+            previous = baseline.get(case, {}).get(stage)
+            if previous is not None and seconds > previous * tolerance and seconds - previous > noise:
+                regressions.append((case, stage, previous, seconds))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the trim normals kernel on generated meshes.")
+    parser.add_argument("--cases", nargs="+", choices=sorted(meshes.CASES), default=sorted(meshes.CASES))
+    parser.add_argument("--max-loops", type=int, default=max(SIZES), help="Skip sizes above this loop count")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest counts")
+    parser.add_argument("--baseline", default=str(Path(__file__).parent / "baseline.json"))
+    parser.add_argument("--update", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="Allowed slowdown factor (default: 2)")
+    parser.add_argument("--noise", type=float, default=0.005, help="Ignore slowdowns under this many seconds (default: 0.005)")
+    args = parser.parse_args(argv)
+
+    results = dict()
+    mismatches = list()
+    for name in args.cases:
+        for size in SIZES:
+            if size > args.max_loops:
+                continue
+            loops, trims, stages, case_mismatches = run_case(meshes.CASES[name], size, args.repeat)
+            case = "{}/{}".format(name, size)
+            results[case] = stages
+            mismatches.extend((case, stage, error) for stage, error in case_mismatches)
+            print("{} ({} loops, {} trim edges)".format(case, loops, trims))
+            for stage, seconds in stages.items():
+                print("  {:<24} {:10.3f} ms".format(stage, seconds * 1000))
+
+    for case, stage, error in mismatches:
+        print("MISMATCH {} {}: differs from the NumPy engine by {:.3g}".format(case, stage, error), file=sys.stderr)
+    if mismatches:
+        return 1
+
+    if args.update:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print("Wrote baseline to {}".format(args.baseline))
+        return 0
+
+    try:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print("No baseline at {}; run with --update to record one".format(args.baseline))
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.noise)
+    for case, stage, previous, seconds in regressions:
+        print("REGRESSION {} {}: {:.3f} ms -> {:.3f} ms".format(case, stage, previous * 1000, seconds * 1000), file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Saved edge sets, packed as bits of one int32 word per edge. Blender stores the words in a single INT
+# edge attribute however many sets there are; bit i holds set i. Bit 31 is the sign bit, so the words
+# are handled as uint32 here and stored as int32.
+
+import numpy as np
+
+MAX_SETS = 32
+
+def get_bit(index):
+    return np.uint32(1) << np.uint32(index)
+
+def as_words(words):
+    return np.asarray(words, dtype=np.int32).view(np.uint32)
+
+def as_stored(words):
+    return np.ascontiguousarray(words, dtype=np.uint32).view(np.int32)
+
+def read_set(words, index):
+    """Returns the per-edge mask of one set."""
+    return (as_words(words) & get_bit(index)) != 0
+
+def write_set(words, index, mask):
+    """Returns the words with one set replaced by the mask."""
+    words = as_words(words) & ~get_bit(index)
+    return as_stored(words | np.where(mask, get_bit(index), np.uint32(0)))
+
+def clear_set(words, index):
+    return as_stored(as_words(words) & ~get_bit(index))
+
+def get_set_bits(indices):
+    """Combines set indices into a bitmask, for union and intersect."""
+    bits = np.uint32(0)
+    for index in indices:
+        bits |= get_bit(index)
+    return bits
+
+def union(words, indices):
+    """Returns the mask of edges in any of the sets."""
+    return (as_words(words) & get_set_bits(indices)) != 0
+
+def intersect(words, indices):
+    """Returns the mask of edges in all of the sets. No sets gives no edges."""
+    bits = get_set_bits(indices)
+    if bits == 0:
+        return np.zeros(len(words), dtype=bool)
+    return (as_words(words) & bits) == bits
+
+def get_free_index(used):
+    """Returns the lowest set index not in used, or None when all MAX_SETS are taken."""
+    for index in range(MAX_SETS):
+        if index not in used:
+            return index
+    return None
+
+
+# Selection masks
+#################################################
+
+# The selection operators' mask work, kept here with the set helpers so it runs (and is benchmarked)
+# without Blender.
+
+def combine_masks(masks, edge_count, combine='OR', invert=False):
+    """Returns the union or intersection of per-edge masks, inverted if asked. No masks gives no edges."""
+    if len(masks) == 0:
+        selected = np.zeros(edge_count, dtype=bool)
+    elif combine == 'AND':
+        selected = np.logical_and.reduce(masks)
+    else:
+        selected = np.logical_or.reduce(masks)
+    return ~selected if invert else selected
+
+def get_vertex_mask(edge_vertices, selected, vertex_count):
+    """Returns the per-vertex mask of the vertices used by the selected edges."""
+    vertices = np.zeros(vertex_count, dtype=bool)
+    vertices[np.asarray(edge_vertices)[selected].ravel()] = True
+    return vertices
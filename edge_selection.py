@@ -0,0 +1,207 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Edge mask helpers behind the selection operators. Kept out of selection.py so NumPy only loads
+# when an operator first runs.
+
+import bpy
+import numpy as np
+
+from . import edge_masks
+from . import kernel
+from . import mesh_io
+from .profiling import NULL_PROFILE
+
+# Every saved edge set lives in this one INT edge attribute, one bit per set (see edge_masks). The set
+# names and bits are in mesh.trim_normals_edge_sets.
+SAVED_ATTRIBUTE = 'trimsheet_edge'
+LEGACY_SET_NAME = 'Saved'
+
+def get_save_collection(mesh):
+    attr = mesh.attributes.get(SAVED_ATTRIBUTE)
+    if not attr:
+        attr = mesh.attributes.new(SAVED_ATTRIBUTE, 'INT', 'EDGE')
+    return attr
+
+def migrate_saved_edges(obj):
+    """Older versions saved a single selection in a BOOLEAN attribute, which Edit Mode can't reach through
+    BMesh. Converts it once to bit 0 of the INT attribute, as a set named LEGACY_SET_NAME.
+
+    An INT attribute without sets is left alone: that's what removing the last set leaves behind."""
+    attr = obj.data.attributes.get(SAVED_ATTRIBUTE)
+    if attr is None or attr.data_type == 'INT':
+        return
+    mode = obj.mode
+    try:
+        bpy.ops.object.mode_set(mode='OBJECT')
+        attr = obj.data.attributes.get(SAVED_ATTRIBUTE)
+        saved = mesh_io.read_array(attr.data, "value", bool)
+        obj.data.attributes.remove(attr)
+        get_save_collection(obj.data).data.foreach_set("value", saved.astype(np.int32))
+    finally:
+        bpy.ops.object.mode_set(mode=mode)
+    edge_set = obj.data.trim_normals_edge_sets.add()
+    edge_set.name = LEGACY_SET_NAME
+    edge_set.index = 0
+
+def get_edge_sets(obj):
+    """Returns the mesh's edge set collection, first bringing an older single-set save over."""
+    migrate_saved_edges(obj)
+    return obj.data.trim_normals_edge_sets
+
+def get_active_set(obj):
+    edge_sets = get_edge_sets(obj)
+    index = obj.data.trim_normals_edge_set_index
+    return edge_sets[index] if 0 <= index < len(edge_sets) else None
+
+def add_edge_set(obj, name, selected=None):
+    """Adds a set holding the selected edges (none by default) on a free bit and makes it active. Returns
+    None when all bits are taken."""
+    edge_sets = get_edge_sets(obj)
+    index = edge_masks.get_free_index(set(s.index for s in edge_sets))
+    if index is None:
+        return None
+    # Written in one go, whatever the bit was last used for: in Edit Mode, reading the words again after
+    # writing them would need another sync.
+    words = read_saved_words(obj)
+    if selected is None:
+        write_saved_words(obj, edge_masks.clear_set(words, index), words)
+    else:
+        write_saved_words(obj, edge_masks.write_set(words, index, selected), words)
+    edge_set = edge_sets.add()
+    edge_set.name = name
+    edge_set.index = index
+    obj.data.trim_normals_edge_set_index = len(edge_sets) - 1
+    return edge_set
+
+def remove_edge_set(obj, position):
+    edge_sets = get_edge_sets(obj)
+    words = read_saved_words(obj)
+    write_saved_words(obj, edge_masks.clear_set(words, edge_sets[position].index), words)
+    edge_sets.remove(position)
+    obj.data.trim_normals_edge_set_index = min(position, len(edge_sets) - 1)
+
+def read_saved_words(obj):
+    """Reads the packed words of every edge set, in either mode. Expects sync_edit_mesh to have run."""
+    return mesh_io.read_edge_layer(obj, SAVED_ATTRIBUTE)
+
+def write_saved_words(obj, words, current=None):
+    """Writes the packed words back. current, the words read_saved_words returned, saves rereading them."""
+    mesh_io.write_edge_layer(obj, SAVED_ATTRIBUTE, words, current)
+
+def save_edge_set(obj, edge_set, selected):
+    words = read_saved_words(obj)
+    write_saved_words(obj, edge_masks.write_set(words, edge_set.index, selected), words)
+
+def get_combined_sets(obj, combine):
+    """Returns the union or intersection of the sets ticked in the list, or the active set if none are."""
+    edge_sets = get_edge_sets(obj)
+    indices = [s.index for s in edge_sets if s.use]
+    if len(indices) == 0:
+        active = get_active_set(obj)
+        indices = [active.index] if active is not None else []
+    words = read_saved_words(obj)
+    if combine == 'AND':
+        return edge_masks.intersect(words, indices)
+    return edge_masks.union(words, indices)
+
+def get_edge_mask(obj, source):
+    """Reads one of the per-edge masks the selection operators can combine. Expects sync_edit_mesh to have run."""
+    mesh = obj.data
+    if source == 'SEAMS':
+        return mesh_io.read_array(mesh.edges, "use_seam", bool)
+    if source == 'SHARP':
+        return mesh_io.read_array(mesh.edges, "use_edge_sharp", bool)
+    if source == 'SAVED':
+        active = get_active_set(obj)
+        if active is None:
+            return np.zeros(len(mesh.edges), dtype=bool)
+        return edge_masks.read_set(read_saved_words(obj), active.index)
+    if source == 'SETS_OR':
+        return get_combined_sets(obj, 'OR')
+    if source == 'SETS_AND':
+        return get_combined_sets(obj, 'AND')
+    return mesh_io.read_selected_edges(mesh)
+
+def set_edge_selection(obj, selected):
+    """Selects exactly the edges in the mask, along with their vertices, and deselects all faces. Expects
+    the object in Edit Mode and sync_edit_mesh to have run."""
+    mesh = obj.data
+    mesh_io.write_edit_selection(mesh, selected, mesh_io.read_selected_edges(mesh))
+
+def enter_edit_mode(obj, profile=NULL_PROFILE):
+    """Switches to Edit Mode before the selection is written. Selecting in Object Mode instead would let
+    entering Edit Mode flush the vertex selection, adding every edge between two selected vertices."""
+    if obj.mode == 'EDIT':
+        return
+    with profile.phase("mode switch"):
+        bpy.ops.object.mode_set(mode='EDIT')
+        # The BMesh selection was flushed on the way in; write_edit_selection compares against it.
+        mesh_io.sync_edit_mesh(obj)
+
+def select_edges_from(context, sources, combine='OR', invert=False, profile=NULL_PROFILE):
+    """Replaces the active mesh's edge selection with the union or intersection of the source masks."""
+    obj = context.active_object
+    with profile.phase("sync"):
+        mesh = mesh_io.sync_edit_mesh(obj)
+
+    with profile.phase("read"):
+        masks = [get_edge_mask(obj, source) for source in sources]
+        selected = edge_masks.combine_masks(masks, len(mesh.edges), combine, invert)
+
+    enter_edit_mode(obj, profile)
+    with profile.phase("select"):
+        set_edge_selection(obj, selected)
+
+    profile.count("edges", len(selected))
+    profile.count("edges selected", selected.sum())
+
+def detect_bevel_edges(context, axis, band, angle_range, save=True, profile=NULL_PROFILE):
+    """Selects the edges bounding bevel strips mapped onto the trim sheet's bevel band, and saves them into
+    the active edge set when save is set. Returns the number of edges found, or None without a UV map."""
+    obj = context.active_object
+    with profile.phase("sync"):
+        mesh = mesh_io.sync_edit_mesh(obj)
+
+    with profile.phase("read"):
+        loop_uv = mesh_io.read_loop_uvs(obj)
+        if loop_uv is None:
+            return None
+        data = mesh_io.read_mesh(mesh)
+
+    with profile.phase("detect"):
+        selected = kernel.detect_bevel_edges(data, loop_uv, 0 if axis == 'U' else 1, band, angle_range)
+    if selected is None:
+        return None
+
+    enter_edit_mode(obj, profile)
+    with profile.phase("select"):
+        set_edge_selection(obj, selected)
+    if save:
+        with profile.phase("save"):
+            edge_set = get_active_set(obj)
+            if edge_set is None:
+                add_edge_set(obj, LEGACY_SET_NAME, selected)
+            else:
+                save_edge_set(obj, edge_set, selected)
+
+    profile.count("edges", len(selected))
+    profile.count("edges selected", selected.sum())
+    return int(selected.sum())
@@ -0,0 +1,1233 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# The adjustment itself, kept free of bpy so it can run outside Blender (worker processes, CI, benchmarks).
+# mesh_io fills a MeshData from a bpy.types.Mesh.
+
+import hashlib
+import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .profiling import NULL_PROFILE
+
+# There's one somewhat annoying limitation here, which is that it mostly assumes mostly simple quad modeling.
+# That works ok for my use case, but it might be interesting to extend this to more complicated models.
+
+class AdjustParams:
+    """The tunable parts of the adjustment.
+
+    Trim edges end up target_angle apart, each side rotating rotation_weight of the difference.
+    smooth_angle of None uses the mesh's auto smooth angle."""
+    __slots__ = ("target_angle", "rotation_weight", "smooth_angle")
+
+    def __init__(self, target_angle=math.pi / 2, rotation_weight=0.5, smooth_angle=None):
+        self.target_angle = target_angle
+        self.rotation_weight = rotation_weight
+        self.smooth_angle = smooth_angle
+
+    def key(self):
+        return (self.target_angle, self.rotation_weight, self.smooth_angle)
+
+    def get_smooth_angle(self, data):
+        return data.auto_smooth_angle if self.smooth_angle is None else self.smooth_angle
+
+
+class MeshData:
+    """Compact array-backed description of everything the adjustment reads from a mesh.
+
+    Loop and polygon arrays are indexed like the bpy collections they came from. The derived topology
+    (loop_poly, edge_polygons) is built by build_topology, so it can run wherever the kernel runs.
+    loop_normal may be None when the mesh's split normals include custom normals; the engines then
+    rebuild the automatic ones with compute_split_normals where they need them. poly_smooth holds each
+    polygon's smooth shading flag (all smooth by default); edges of flat polygons are split, like Blender
+    treats them. The vertex -> loop and
+    edge -> loop indexes are only built by build_loop_index, for runs that look up many small regions."""
+    __slots__ = (
+        "vertex_co",
+        "edge_vertices",
+        "edge_sharp",
+        "loop_vertex",
+        "loop_edge",
+        "loop_normal",
+        "poly_loop_start",
+        "poly_loop_total",
+        "poly_normal",
+        "auto_smooth_angle",
+        "poly_smooth",
+        "loop_poly",
+        "edge_polygons",
+        "vertex_loop_offsets",
+        "vertex_loops",
+        "edge_loop_offsets",
+        "edge_loops",
+    )
+
+    def __init__(self, vertex_co, edge_vertices, edge_sharp, loop_vertex, loop_edge, loop_normal,
+                 poly_loop_start, poly_loop_total, poly_normal, auto_smooth_angle, poly_smooth=None):
+        self.vertex_co = np.asarray(vertex_co, dtype=np.float64).reshape(-1, 3)
+        self.edge_vertices = np.asarray(edge_vertices, dtype=np.int64).reshape(-1, 2)
+        self.edge_sharp = np.asarray(edge_sharp, dtype=bool)
+        self.loop_vertex = np.asarray(loop_vertex, dtype=np.int64)
+        self.loop_edge = np.asarray(loop_edge, dtype=np.int64)
+        self.loop_normal = None if loop_normal is None else np.asarray(loop_normal, dtype=np.float64).reshape(-1, 3)
+        self.poly_loop_start = np.asarray(poly_loop_start, dtype=np.int64)
+        self.poly_loop_total = np.asarray(poly_loop_total, dtype=np.int64)
+        self.poly_normal = np.asarray(poly_normal, dtype=np.float64).reshape(-1, 3)
+        self.auto_smooth_angle = float(auto_smooth_angle)
+        if poly_smooth is None:
+            self.poly_smooth = np.ones(len(self.poly_loop_start), dtype=bool)
+        else:
+            self.poly_smooth = np.asarray(poly_smooth, dtype=bool)
+        self.loop_poly = None
+        self.edge_polygons = None
+        self.vertex_loop_offsets = None
+        self.vertex_loops = None
+        self.edge_loop_offsets = None
+        self.edge_loops = None
+
+    @property
+    def vertex_count(self):
+        return len(self.vertex_co)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_vertices)
+
+    @property
+    def loop_count(self):
+        return len(self.loop_vertex)
+
+    @property
+    def poly_count(self):
+        return len(self.poly_loop_start)
+
+    def build_topology(self):
+        """Build the loop -> polygon and edge -> polygon maps, if they haven't been built yet."""
+        if self.loop_poly is not None:
+            return
+        loops, owners = self.get_polygon_loops(np.arange(self.poly_count))
+        self.loop_poly = np.empty(self.loop_count, dtype=np.int64)
+        self.loop_poly[loops] = owners
+        self.build_edge_polygon_map()
+
+    def build_edge_polygon_map(self):
+        """Build the edge -> (poly, poly) map for manifold edges.
+
+        edge_polygons[e] holds the two polygons sharing edge e, or -1 for boundary and non-manifold edges."""
+        counts = np.bincount(self.loop_edge, minlength=self.edge_count)
+        order = np.argsort(self.loop_edge, kind="stable")
+        first = np.cumsum(counts) - counts
+
+        self.edge_polygons = np.full((self.edge_count, 2), -1, dtype=np.int64)
+        manifold = np.flatnonzero(counts == 2)
+        polys_a = self.loop_poly[order[first[manifold]]]
+        polys_b = self.loop_poly[order[first[manifold] + 1]]
+        # An edge used twice by the same polygon doesn't separate anything.
+        distinct = polys_a != polys_b
+        self.edge_polygons[manifold[distinct], 0] = polys_a[distinct]
+        self.edge_polygons[manifold[distinct], 1] = polys_b[distinct]
+
+    def build_loop_index(self):
+        """Build CSR-style vertex -> loop and edge -> loop indexes, if they haven't been built yet.
+
+        The loops using vertex v are vertex_loops[vertex_loop_offsets[v]:vertex_loop_offsets[v + 1]], and
+        likewise for edges, in loop order."""
+        if self.vertex_loops is not None:
+            return
+        self.edge_loop_offsets, self.edge_loops = get_index(self.loop_edge, self.edge_count)
+        self.vertex_loop_offsets, self.vertex_loops = get_index(self.loop_vertex, self.vertex_count)
+
+    def get_vertex_loops(self, vertices):
+        """Returns the loops using any of the given distinct vertices, through the loop index if it's built."""
+        if self.vertex_loops is None:
+            mask = np.zeros(self.vertex_count, dtype=bool)
+            mask[vertices] = True
+            return np.flatnonzero(mask[self.loop_vertex])
+        return get_index_items(self.vertex_loop_offsets, self.vertex_loops, vertices)
+
+    def get_edge_loops(self, edges):
+        """Returns the loops using any of the given distinct edges, through the loop index if it's built."""
+        if self.edge_loops is None:
+            mask = np.zeros(self.edge_count, dtype=bool)
+            mask[edges] = True
+            return np.flatnonzero(mask[self.loop_edge])
+        return get_index_items(self.edge_loop_offsets, self.edge_loops, edges)
+
+    def get_polygon_loops(self, polys):
+        """Returns the loop indices of the given polygons, and for each loop its position in polys."""
+        totals = self.poly_loop_total[polys]
+        owners = np.repeat(np.arange(len(polys)), totals)
+        # Loops are contiguous per polygon, so each polygon's loops are loop_start + 0..loop_total.
+        offsets = np.cumsum(totals) - totals
+        loops = np.repeat(self.poly_loop_start[polys] - offsets, totals) + np.arange(len(owners))
+        return loops, owners
+
+    def get_loop_polygons(self, loops):
+        """Returns the polygon of each of the given loops, without building the whole topology if it can avoid it."""
+        if self.loop_poly is None:
+            if len(loops) == 0:
+                return np.zeros(0, dtype=np.int64)
+            if self.has_ordered_polygons():
+                return np.searchsorted(self.poly_loop_start, loops, side="right") - 1
+            self.build_topology()
+        return self.loop_poly[loops]
+
+    def has_ordered_polygons(self):
+        """True when polygons are laid out in loop order, as Blender stores them."""
+        return bool(np.all(self.poly_loop_start[1:] >= self.poly_loop_start[:-1]))
+
+    def get_adjacent_loops(self):
+        """Returns the previous and next loop of every loop, going around its polygon."""
+        self.build_topology()
+        start = self.poly_loop_start[self.loop_poly]
+        total = self.poly_loop_total[self.loop_poly]
+        offset = np.arange(self.loop_count) - start
+        return start + (offset - 1) % total, start + (offset + 1) % total
+
+    def get_polygon_loop_range(self, poly):
+        """Returns the range of loop indices of a single polygon."""
+        start = int(self.poly_loop_start[poly])
+        return range(start, start + int(self.poly_loop_total[poly]))
+
+    def get_polygon_edges(self, poly):
+        """Returns the edge indices of a single polygon, in loop order."""
+        start = self.poly_loop_start[poly]
+        return self.loop_edge[start:start + self.poly_loop_total[poly]]
+
+    def get_affected_vertices(self, selected):
+        """Returns a per-vertex mask of the vertices used by the selected edges."""
+        affected = np.zeros(self.vertex_count, dtype=bool)
+        affected[self.edge_vertices[selected].ravel()] = True
+        return affected
+
+
+def get_index(keys, key_count):
+    """Groups the positions of keys by key, as CSR (offsets, items) arrays: the positions holding key k
+    are items[offsets[k]:offsets[k + 1]], in order."""
+    counts = np.bincount(keys, minlength=key_count)
+    return np.concatenate(([0], np.cumsum(counts))), np.argsort(keys, kind="stable")
+
+def get_index_items(offsets, items, keys):
+    """Concatenates the items of each of the given keys of a get_index index."""
+    starts = offsets[keys]
+    counts = offsets[np.asarray(keys) + 1] - starts
+    # Same trick as get_polygon_loops: each key's items are contiguous from its offset.
+    positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    return items[positions]
+
+def is_sorted_member(sorted_values, values):
+    """Per-value mask of the values found in sorted_values."""
+    if len(sorted_values) == 0:
+        return np.zeros(len(values), dtype=bool)
+    found = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[found] == values
+
+def get_unique(values, return_inverse=False):
+    """np.unique for the integer index arrays here, by sorting. Recent NumPy versions hash in np.unique
+    instead, which is many times slower on arrays this size."""
+    values = np.asarray(values)
+    order = np.argsort(values, kind="stable")
+    ordered = values[order]
+    first = np.ones(len(values), dtype=bool)
+    first[1:] = ordered[1:] != ordered[:-1]
+    if not return_inverse:
+        return ordered[first]
+    inverse = np.empty(len(values), dtype=np.int64)
+    inverse[order] = np.cumsum(first) - 1
+    return ordered[first], inverse
+
+def get_angles(normals_a, normals_b):
+    """Row-wise Vector.angle for two arrays of vectors."""
+    cos = np.einsum("ij,ij->i", normals_a, normals_b)
+    lengths = np.linalg.norm(normals_a, axis=1) * np.linalg.norm(normals_b, axis=1)
+    return np.arccos(np.clip(cos / np.maximum(lengths, 1e-12), -1.0, 1.0))
+
+def get_edge_angles(data, edges):
+    """Returns the angle between the normals of the two polygons sharing each of the given manifold edges."""
+    return get_angles(data.poly_normal[data.edge_polygons[edges, 0]], data.poly_normal[data.edge_polygons[edges, 1]])
+
+def get_smooth_candidates(data, selected, geometry=None):
+    """Returns the edges that may be smooth, and their angles, read from geometry when given.
+
+    Only manifold edges between smooth shaded polygons can be smooth, and selected and sharp edges are
+    always split."""
+    candidates = np.flatnonzero((data.edge_polygons[:, 0] >= 0) & ~selected & ~data.edge_sharp)
+    candidates = candidates[data.poly_smooth[data.edge_polygons[candidates]].all(axis=1)]
+    if geometry is not None:
+        return candidates, geometry.angles[candidates]
+    return candidates, get_edge_angles(data, candidates)
+
+def classify_smooth_edges(data, selected, smooth_angle=None, candidates=None):
+    """Classify every edge as smooth (True) or split (False) in one pass.
+
+    Candidate edges are smooth when their polygons meet at less than smooth_angle, which defaults to
+    the auto smooth angle. Precomputed get_smooth_candidates results can be passed in."""
+    if candidates is None:
+        candidates = get_smooth_candidates(data, selected)
+    if smooth_angle is None:
+        smooth_angle = data.auto_smooth_angle
+    edges, angles = candidates
+    smooth = np.zeros(data.edge_count, dtype=bool)
+    smooth[edges[angles < smooth_angle]] = True
+    return smooth
+
+
+class EdgeGeometry:
+    """Dihedral angle and rotation axis of manifold edges, from their polygons' normals.
+
+    axes[e] is the unit axis rotating the normal of edge_polygons[e, 0] toward that of edge_polygons[e, 1];
+    the other way round, it's negated. Edges whose polygons are parallel have no axis and aren't valid.
+    Edges are only computed when first asked for, so one EdgeGeometry can serve every run on a mesh,
+    whatever is selected, until its geometry changes."""
+    def __init__(self, edge_count):
+        self.angles = np.zeros(edge_count)
+        self.axes = np.zeros((edge_count, 3))
+        self.valid = np.zeros(edge_count, dtype=bool)
+        self.known = np.zeros(edge_count, dtype=bool)
+
+    @classmethod
+    def build(cls, data):
+        """Geometry of every manifold edge of data."""
+        data.build_topology()
+        geometry = cls(data.edge_count)
+        geometry.update(data, np.flatnonzero(data.edge_polygons[:, 0] >= 0))
+        return geometry
+
+    def update(self, data, edges, targets=None):
+        """Computes the given manifold edges of data that aren't known yet, storing them at targets
+        (the same indices, by default). Edges are marked known last, so concurrent readers only see
+        finished ones."""
+        targets = edges if targets is None else targets
+        missing = ~self.known[targets]
+        edges = edges[missing]
+        targets = targets[missing]
+        first_normals = data.poly_normal[data.edge_polygons[edges, 0]]
+        second_normals = data.poly_normal[data.edge_polygons[edges, 1]]
+        axes = np.cross(first_normals, second_normals)
+        axis_lengths = np.linalg.norm(axes, axis=1)
+        valid = axis_lengths > 1e-12
+        axes[valid] /= axis_lengths[valid, None]
+        self.angles[targets] = get_angles(first_normals, second_normals)
+        self.axes[targets] = axes
+        self.valid[targets] = valid
+        self.known[targets] = True
+
+    def get_rotations(self, edges, flipped):
+        """Returns the angle, unit axis and validity of rotating across each edge, from its first polygon
+        toward the second, or the other way round where flipped."""
+        axes = self.axes[edges]
+        axes[flipped] *= -1.0
+        return self.angles[edges], axes, self.valid[edges]
+
+
+class WorkingSet:
+    """The part of a mesh an adjustment can change, extracted as a MeshData of its own.
+
+    That's every polygon using an affected vertex. Edges at an affected vertex keep all their polygons,
+    so the engines compute exactly the same normals on the extracted mesh as on the whole one, in time
+    proportional to the selection rather than the mesh.
+
+    Affected vertices are those of the selected edges, within the region vertex mask if there is one, or
+    the sorted vertex indices given as vertices. With vertices and data's loop index (build_loop_index),
+    nothing scans the whole mesh, so many small working sets cost about as much as one big one.
+
+    Its geometry is an EdgeGeometry of the extracted mesh. Edges at affected vertices are the same there as
+    in the whole mesh, so with a geometry for the whole mesh, those are read from it, or computed into it."""
+    def __init__(self, data, selected, region=None, geometry=None, vertices=None):
+        partial = region is not None or vertices is not None
+        if vertices is None:
+            affected = data.get_affected_vertices(selected)
+            if region is not None:
+                affected &= region
+            vertices = np.flatnonzero(affected)
+        self.loop_count = data.loop_count
+
+        polys = get_unique(data.get_loop_polygons(data.get_vertex_loops(vertices)))
+        if partial:
+            # Selected edges of those polygons may end outside the region. Their polygons are needed too,
+            # so the edges are manifold (and influential) in the extracted mesh exactly when they are here.
+            edges = data.loop_edge[data.get_polygon_loops(polys)[0]]
+            reached = get_unique(edges[selected[edges]])
+            polys = get_unique(np.concatenate((polys, data.get_loop_polygons(data.get_edge_loops(reached)))))
+
+        self.loops, _ = data.get_polygon_loops(polys)
+        extracted, loop_vertex = get_unique(data.loop_vertex[self.loops], return_inverse=True)
+        edges, loop_edge = get_unique(data.loop_edge[self.loops], return_inverse=True)
+        totals = data.poly_loop_total[polys]
+
+        self.data = MeshData(
+            vertex_co=data.vertex_co[extracted],
+            edge_vertices=np.searchsorted(extracted, data.edge_vertices[edges]),
+            edge_sharp=data.edge_sharp[edges],
+            loop_vertex=loop_vertex,
+            loop_edge=loop_edge,
+            loop_normal=None if data.loop_normal is None else data.loop_normal[self.loops],
+            poly_loop_start=np.cumsum(totals) - totals,
+            poly_loop_total=totals,
+            poly_normal=data.poly_normal[polys],
+            auto_smooth_angle=data.auto_smooth_angle,
+            poly_smooth=data.poly_smooth[polys],
+        )
+        if self.data.loop_normal is None:
+            # Fans around affected vertices are complete here, so their automatic normals are exact.
+            self.data.loop_normal = compute_split_normals(self.data)
+        self.selected = selected[edges]
+        self.region = is_sorted_member(vertices, extracted)
+        self.geometry = self.get_geometry(edges, geometry)
+
+    def get_geometry(self, edges, geometry):
+        data = self.data
+        data.build_topology()
+        if geometry is None:
+            return EdgeGeometry.build(data)
+        # Polygons keep their order when extracted, so complete edges also keep their first polygon.
+        manifold = data.edge_polygons[:, 0] >= 0
+        complete = np.flatnonzero(manifold & self.region[data.edge_vertices].any(axis=1))
+        geometry.update(data, complete, edges[complete])
+
+        extracted = EdgeGeometry(data.edge_count)
+        extracted.angles[complete] = geometry.angles[edges[complete]]
+        extracted.axes[complete] = geometry.axes[edges[complete]]
+        extracted.valid[complete] = geometry.valid[edges[complete]]
+        extracted.known[complete] = True
+        extracted.update(data, np.flatnonzero(manifold))
+        return extracted
+
+    def scatter(self, normals, out=None):
+        """Expands per-loop results on the extracted mesh to the whole mesh, zero everywhere else.
+
+        With out, writes the loops on region vertices into it instead, leaving the rest of out alone."""
+        if out is None:
+            out = np.zeros((self.loop_count, 3))
+            out[self.loops] = normals
+        else:
+            inside = self.region[self.data.loop_vertex]
+            out[self.loops[inside]] = normals[inside]
+        return out
+
+
+# Python reference engine
+#################################################
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+def _angle(a, b):
+    lengths = math.sqrt(_dot(a, a) * _dot(b, b))
+    return math.acos(max(-1.0, min(1.0, _dot(a, b) / max(lengths, 1e-12))))
+
+def _rotate(v, axis, angle):
+    """Rotates v about axis by angle, like Vector.rotate(Quaternion(axis, angle)). A zero axis doesn't rotate."""
+    length = math.sqrt(_dot(axis, axis))
+    if length < 1e-12:
+        return v
+    k = (axis[0] / length, axis[1] / length, axis[2] / length)
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+    kv = _cross(k, v)
+    d = _dot(k, v) * (1.0 - cos)
+    return tuple(v[i] * cos + kv[i] * sin + k[i] * d for i in range(3))
+
+
+class AdjustState:
+    """Stores and answers questions about the state of the mesh for the adjustment."""
+    def __init__(self, data, selected_edges, region=None, params=None, geometry=None):
+        self.data = data
+        self.data.build_topology()
+        self.geometry = geometry if geometry is not None else EdgeGeometry.build(data)
+        self.params = params if params is not None else AdjustParams()
+        self.normals = dict()
+        self.affected_vertices = set()
+        self.selected_edges = selected_edges
+        for e in selected_edges:
+            self.affected_vertices.add(int(data.edge_vertices[e, 0]))
+            self.affected_vertices.add(int(data.edge_vertices[e, 1]))
+        if region is not None:
+            self.affected_vertices = set(v for v in self.affected_vertices if region[v])
+        self.build_vertex_polygon_index()
+
+        self.selected_mask = np.zeros(data.edge_count, dtype=bool)
+        self.selected_mask[list(selected_edges)] = True
+        candidates = get_smooth_candidates(data, self.selected_mask, self.geometry)
+        self.smooth_edges = classify_smooth_edges(data, None, self.params.smooth_angle, candidates)
+        self.shared_edges = dict()
+        # Work counters, reported once the engine finishes.
+        self.loops_visited = 0
+        self.polygons_scanned = 0
+        self.influential_pairs = 0
+
+    def build_vertex_polygon_index(self):
+        """Build a CSR-style vertex -> polygon index so adjacency lookups don't have to scan every polygon.
+
+        The polygons using vertex v are vertex_polygons[vertex_offsets[v]:vertex_offsets[v + 1]], in polygon order."""
+        order = np.lexsort((self.data.loop_poly, self.data.loop_vertex))
+        counts = np.bincount(self.data.loop_vertex, minlength=self.data.vertex_count)
+        self.vertex_offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.vertex_polygons = self.data.loop_poly[order]
+
+    @property
+    def affected_loops(self):
+        return self.normals.keys()
+
+    def get_loop_normal(self, loop):
+        normal = self.normals.get(loop)
+        if normal is None:
+            normal = tuple(self.data.loop_normal[loop].tolist())
+        return normal
+
+    def set_loop_normal(self, loop, normal):
+        self.normals[loop] = normal
+
+    def should_affect_loop(self, loop):
+        return int(self.data.loop_vertex[loop]) in self.affected_vertices
+
+    def get_connected_polygons(self, vertex_id):
+        """Returns the indices of all polygons in this mesh that have vertex_id as a vertex"""
+        start = self.vertex_offsets[vertex_id]
+        end = self.vertex_offsets[vertex_id + 1]
+        return self.vertex_polygons[start:end].tolist()
+
+    def get_influential_polygons(self, poly, loop):
+        """Return all polygons that should influence the normal of a given loop.  This means they're connected to the same vertex and share a selected edge."""
+        connected = [p for p in self.get_connected_polygons(int(self.data.loop_vertex[loop])) if p != poly]
+        influential = [p for p in connected if self.shares_selected_edge(poly, p)]
+        self.polygons_scanned += len(connected)
+        self.influential_pairs += len(influential)
+        return influential
+
+    def shares_selected_edge(self, poly_a, poly_b):
+        """Returns True if two polygons share an edge that is in the selected edge set."""
+        return bool(self.selected_mask[self.get_shared_edges(poly_a, poly_b)].any())
+
+    def get_rotation(self, poly_a, poly_b):
+        """Returns the angle between two polygons sharing a selected edge, and the unit axis rotating
+        poly_a's normal toward poly_b's, or None if they're parallel. Read from the edge geometry."""
+        shared = self.get_shared_edges(poly_a, poly_b)
+        edge = next(e for e in shared if self.selected_mask[e])
+        if not self.geometry.valid[edge]:
+            return float(self.geometry.angles[edge]), None
+        axis = self.geometry.axes[edge].tolist()
+        if self.data.edge_polygons[edge, 0] != poly_a:
+            axis = [-a for a in axis]
+        return float(self.geometry.angles[edge]), axis
+
+    def get_shared_edges(self, poly_a, poly_b):
+        """Gets a list of manifold edge indices shared by two polygons, memoized per pair."""
+        key = (poly_a, poly_b)
+        shared = self.shared_edges.get(key)
+        if shared is None:
+            b_edges = self.data.get_polygon_edges(poly_b)
+            shared = b_edges[(self.data.edge_polygons[b_edges] == poly_a).any(axis=1)].tolist()
+            self.shared_edges[key] = shared
+        return shared
+
+    def should_smooth(self, poly_a, poly_b):
+        """Given two polygons, figure out if their shared edge should have its normals smoothed or split."""
+        shared = self.get_shared_edges(poly_a, poly_b)
+        if len(shared) == 0:
+            return False
+
+        # This might not work in some cases, so... those strange cases aren't supported.
+        return bool(self.smooth_edges[shared[0]])
+
+    def get_smooth_adjacent(self, candidates, poly_id):
+        """Given a list of candidate polygons, return any that are adjacent to poly_id and should be smoothed."""
+        ret = list()
+        for p in candidates:
+            if p == poly_id:
+                continue
+            if self.should_smooth(poly_id, p):
+                ret.append(p)
+        return ret
+
+
+    def get_smooth_set(self, candidates, poly_id):
+        """Given a list of candidate polygons, return a set of polygons that should have its normals smoothed with that poly_id"""
+        smooth = set([poly_id])
+        remaining = list([poly_id])
+        while len(remaining) > 0:
+            p = remaining.pop()
+            new = self.get_smooth_adjacent(candidates, p)
+            for n in new:
+                if n not in smooth:
+                    remaining.append(n)
+                    smooth.add(n)
+
+        return smooth
+
+    def get_smoothing_groups(self):
+        """Yields lists of loop indices around affected vertices whose normals should be smoothed together."""
+        for vertex_id in self.affected_vertices:
+            connected = self.get_connected_polygons(vertex_id)
+
+            seen = set()
+            for poly in connected:
+                if poly in seen:
+                    continue
+                smooth_set = self.get_smooth_set(connected, poly)
+
+                loops = list()
+                for poly in smooth_set:
+                    seen.add(poly)
+                    for l in self.data.get_polygon_loop_range(poly):
+                        if self.data.loop_vertex[l] == vertex_id:
+                            loops.append(l)
+                yield loops
+
+
+def adjust_loop(state, this_poly, loop):
+    """Adjust the split normal of a given loop."""
+    # Only adjust loops associated with affected vertices
+    if not state.should_affect_loop(loop):
+        return
+    state.loops_visited += 1
+
+    # Start with the existing normal
+    new_normal = state.get_loop_normal(loop)
+
+    # For each influential polygon, rotate the normal so that the resulting
+    # angle will be the target angle (90deg by default).
+    for that_poly in state.get_influential_polygons(this_poly, loop):
+        # Get the total angle between the polygons
+        angle, axis = state.get_rotation(this_poly, that_poly)
+        if axis is None:
+            continue
+        # We want a target_angle difference between them
+        angle -= state.params.target_angle
+        # ... and this loop should rotate to cover its share of the delta (half by default)
+        angle *= state.params.rotation_weight
+
+        new_normal = _rotate(new_normal, axis, angle)
+
+    state.set_loop_normal(loop, new_normal)
+
+def smooth_normals(state):
+    """Average out normals for loops that should be smooth shaded. Returns the number of groups."""
+
+    # The previous steps may have left split normals across edges that should be smooth shaded.
+    # This smooths them back out.
+
+    group_count = 0
+    for group in state.get_smoothing_groups():
+        group_count += 1
+        averaged = [0.0, 0.0, 0.0]
+        for loop in group:
+            normal = state.get_loop_normal(loop)
+            for i in range(3):
+                averaged[i] += normal[i]
+        averaged = tuple(a / len(group) for a in averaged)
+        for loop in group:
+            state.set_loop_normal(loop, averaged)
+    return group_count
+
+def compute_normals_python(working, params=None, profile=NULL_PROFILE):
+    """Reference engine: adjusts and smooths one loop at a time.
+
+    Returns one custom normal per loop of the working set, zero for loops the adjustment doesn't affect."""
+    data = working.data
+    with profile.phase("prepare"):
+        state = AdjustState(data, set(np.flatnonzero(working.selected).tolist()), working.region, params, working.geometry)
+
+    with profile.phase("adjust"):
+        for p in range(data.poly_count):
+            for l in data.get_polygon_loop_range(p):
+                adjust_loop(state, p, l)
+
+    with profile.phase("smooth"):
+        group_count = smooth_normals(state)
+
+    profile.count("loops visited", state.loops_visited)
+    profile.count("polygons scanned", state.polygons_scanned)
+    profile.count("influential pairs", state.influential_pairs)
+    profile.count("smoothing groups", group_count)
+
+    normals = np.zeros((data.loop_count, 3))
+    for loop, normal in state.normals.items():
+        normals[loop] = normal
+    return normals
+
+
+# NumPy engine
+#################################################
+
+def get_influential_pairs(data, selected, affected, profile=NULL_PROFILE):
+    """Vectorized get_influential_polygons for every affected loop at once.
+
+    Returns parallel (loops, this_polys, that_polys, edges) arrays, sorted by loop and then by influential
+    polygon so rotations are applied in the same order as adjust_loop applies them. edges holds a selected
+    edge each pair shares."""
+    # Both polygons on each selected edge influence each other.
+    edges = np.flatnonzero(selected & (data.edge_polygons[:, 0] >= 0))
+    this_polys = np.concatenate((data.edge_polygons[edges, 0], data.edge_polygons[edges, 1]))
+    that_polys = np.concatenate((data.edge_polygons[edges, 1], data.edge_polygons[edges, 0]))
+    edges = np.concatenate((edges, edges))
+
+    # Polygons sharing more than one selected edge only count once.
+    pair_keys = this_polys * data.poly_count + that_polys
+    order = np.argsort(pair_keys, kind="stable")
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pair_keys[order[1:]] != pair_keys[order[:-1]]
+    pairs = order[first]
+    this_polys = this_polys[pairs]
+    that_polys = that_polys[pairs]
+    edges = edges[pairs]
+
+    # Each pair influences the loops of this_poly on affected vertices that that_poly also uses.
+    loops, owners = data.get_polygon_loops(this_polys)
+    this_polys = this_polys[owners]
+    that_polys = that_polys[owners]
+    edges = edges[owners]
+    vertices = data.loop_vertex[loops]
+
+    that_unique = get_unique(that_polys)
+    that_loops, that_owners = data.get_polygon_loops(that_unique)
+    corner_keys = np.sort(that_unique[that_owners] * data.vertex_count + data.loop_vertex[that_loops])
+    keys = that_polys * data.vertex_count + vertices
+    found = np.minimum(np.searchsorted(corner_keys, keys), len(corner_keys) - 1)
+    keep = (corner_keys[found] == keys) & affected[vertices]
+    profile.count("polygons scanned", len(keep))
+
+    loops = loops[keep]
+    this_polys = this_polys[keep]
+    that_polys = that_polys[keep]
+    edges = edges[keep]
+    order = np.lexsort((that_polys, loops))
+    return loops[order], this_polys[order], that_polys[order], edges[order]
+
+def rotate_normals(normals, axes, angles):
+    """Rotates each row of normals about the matching unit axis by angle (Rodrigues' formula)."""
+    cos = np.cos(angles)[:, None]
+    sin = np.sin(angles)[:, None]
+    dot = np.einsum("ij,ij->i", axes, normals)[:, None]
+    return normals * cos + np.cross(axes, normals) * sin + axes * dot * (1.0 - cos)
+
+def adjust_normals(normals, loops, angles, axes, valid, params):
+    """Batched adjust_loop: rotates normals[loops] so each influential pair ends up params.target_angle apart."""
+    # We want a target_angle difference between the polygons, and each loop should rotate to
+    # cover its share of the delta.
+    angles = (angles - params.target_angle) * params.rotation_weight
+
+    # A loop with several influential polygons rotates once per polygon, in order, so apply
+    # the rotations in rounds where each loop appears at most once.
+    group_start = np.concatenate(([True], loops[1:] != loops[:-1]))
+    first = np.flatnonzero(group_start)
+    rank = np.arange(len(loops)) - first[np.cumsum(group_start) - 1]
+    for r in range(rank.max() + 1 if len(rank) else 0):
+        batch = (rank == r) & valid
+        batch_loops = loops[batch]
+        normals[batch_loops] = rotate_normals(normals[batch_loops], axes[batch], angles[batch])
+
+class DisjointSet:
+    """Array-backed union-find over items 0..size-1 that merges whole batches of pairs at a time."""
+    def __init__(self, size):
+        self.parent = np.arange(size)
+
+    def find(self, items):
+        """Returns the root of each item, compressing every path along the way."""
+        while True:
+            grandparent = self.parent[self.parent]
+            if np.array_equal(grandparent, self.parent):
+                break
+            self.parent = grandparent
+        return self.parent[items]
+
+    def union(self, a, b):
+        """Merges the sets containing a[i] and b[i] for every i."""
+        while True:
+            root_a = self.find(a)
+            root_b = self.find(b)
+            differ = root_a != root_b
+            if not differ.any():
+                break
+            # Always hang the larger root under the smaller one so the forest can't form cycles.
+            low = np.minimum(root_a[differ], root_b[differ])
+            high = np.maximum(root_a[differ], root_b[differ])
+            np.minimum.at(self.parent, high, low)
+
+def get_smoothing_groups(data, smooth_edges, affected):
+    """Groups the loops around affected vertices into fans that should share one normal.
+
+    Returns parallel (loops, groups) arrays, where loops sharing a group id get smoothed together."""
+    loops = np.flatnonzero(affected[data.loop_vertex])
+    corner_keys = data.loop_poly[loops] * data.vertex_count + data.loop_vertex[loops]
+    order = np.argsort(corner_keys)
+    corner_keys = corner_keys[order]
+    loops = loops[order]
+
+    # Across a smooth edge, the two polygons' corners at each affected end of the edge join one fan.
+    edges = np.flatnonzero(smooth_edges)
+    corners_a = list()
+    corners_b = list()
+    for end in range(2):
+        vertices = data.edge_vertices[edges, end]
+        ends = affected[vertices]
+        vertices = vertices[ends]
+        polys = data.edge_polygons[edges[ends]]
+        corners_a.append(np.searchsorted(corner_keys, polys[:, 0] * data.vertex_count + vertices))
+        corners_b.append(np.searchsorted(corner_keys, polys[:, 1] * data.vertex_count + vertices))
+
+    groups = DisjointSet(len(loops))
+    groups.union(np.concatenate(corners_a), np.concatenate(corners_b))
+    return loops, groups.find(np.arange(len(loops)))
+
+def average_groups(normals, loops, groups):
+    """Replaces normals[loops] with the normalized sum of the normals in each loop's group."""
+    sums = np.zeros((len(loops), 3))
+    np.add.at(sums, groups, normals[loops])
+    lengths = np.linalg.norm(sums, axis=1)
+    sums /= np.maximum(lengths, 1e-12)[:, None]
+    normals[loops] = sums[groups]
+
+class PreparedAdjust:
+    """Everything the NumPy engine derives from the topology and selection alone.
+
+    Building one does the adjacency, influential pair and edge classification work; compute then only
+    runs the rotation and averaging, so it can be rerun cheaply with different AdjustParams."""
+    def __init__(self, data, selected, region=None, profile=NULL_PROFILE, working=None, geometry=None):
+        if working is None:
+            with profile.phase("working set"):
+                working = WorkingSet(data, selected, region, geometry)
+        self.working = working
+        data = working.data
+        selected = working.selected
+
+        with profile.phase("prepare"):
+            data.build_topology()
+            self.data = data
+            self.affected = data.get_affected_vertices(selected) & self.working.region
+
+            self.loops, this_polys, _, edges = get_influential_pairs(data, selected, self.affected, profile)
+            flipped = data.edge_polygons[edges, 0] != this_polys
+            self.angles, self.axes, self.valid = working.geometry.get_rotations(edges, flipped)
+            self.candidates = get_smooth_candidates(data, selected, working.geometry)
+            self.smoothing_groups = dict()
+
+    def get_smoothing_groups(self, smooth_angle):
+        """Returns (loops, groups, group count) for one smoothing threshold."""
+        groups = self.smoothing_groups.get(smooth_angle)
+        if groups is None:
+            smooth_edges = classify_smooth_edges(self.data, None, smooth_angle, self.candidates)
+            loops, group_ids = get_smoothing_groups(self.data, smooth_edges, self.affected)
+            # Every group's id is the position of one of its own loops.
+            groups = loops, group_ids, np.count_nonzero(group_ids == np.arange(len(group_ids)))
+            self.smoothing_groups[smooth_angle] = groups
+        return groups
+
+    def compute(self, params=None, profile=NULL_PROFILE):
+        """Returns one custom normal per loop, zero for loops the adjustment doesn't affect."""
+        return self.working.scatter(self.compute_working(params, profile))
+
+    def compute_working(self, params=None, profile=NULL_PROFILE):
+        """compute for the loops of the working set only."""
+        params = params if params is not None else AdjustParams()
+        affected_loops = self.affected[self.data.loop_vertex]
+        with profile.phase("adjust"):
+            normals = self.data.loop_normal.copy()
+            adjust_normals(normals, self.loops, self.angles, self.axes, self.valid, params)
+
+        with profile.phase("smooth"):
+            loops, groups, group_count = self.get_smoothing_groups(params.get_smooth_angle(self.data))
+            average_groups(normals, loops, groups)
+
+        # Zero normals leave unaffected loops on their automatic split normal.
+        normals[~affected_loops] = 0.0
+
+        profile.count("loops visited", affected_loops.sum())
+        profile.count("influential pairs", len(self.loops))
+        profile.count("smoothing groups", group_count)
+        return normals
+
+def compute_normals_numpy(working, params=None, profile=NULL_PROFILE):
+    """Vectorized engine: adjusts every loop in batches.
+
+    Returns one custom normal per loop of the working set, zero for loops the adjustment doesn't affect."""
+    return PreparedAdjust(None, None, profile=profile, working=working).compute_working(params, profile)
+
+class PreparedCache:
+    """Keeps the PreparedAdjust of the last few meshes, keyed on their topology and selection, so
+    rerunning the adjustment with new parameters skips straight to PreparedAdjust.compute."""
+    def __init__(self, size=4):
+        self.size = size
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def get_key(signature, selected):
+        """Key for a mesh's plain get_signature signature and selection."""
+        return signature, get_selection_hash(selected)
+
+    def lookup(self, name, key):
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != key:
+            return None
+        self.entries.move_to_end(name)
+        return entry[1]
+
+    def store(self, name, key, prepared):
+        self.entries[name] = (key, prepared)
+        self.entries.move_to_end(name)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+class GeometryCache:
+    """Keeps the EdgeGeometry of the last few meshes, keyed on their signature, so runs with a different
+    selection or parameters reuse every edge an earlier run computed."""
+    def __init__(self, size=4):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, name, signature, edge_count):
+        """Returns the mesh's geometry, starting an empty one when its signature changed."""
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != signature:
+            entry = (signature, EdgeGeometry(edge_count))
+        self.entries[name] = entry
+        self.entries.move_to_end(name)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry[1]
+
+ENGINES = {
+    'NUMPY': compute_normals_numpy,
+    'PYTHON': compute_normals_python,
+}
+
+def compute_normals(data, selected, engine='NUMPY', region=None, params=None, profile=NULL_PROFILE, geometry=None):
+    """Runs the adjustment on data for the given per-edge selection mask with the named engine.
+
+    Returns one custom normal per loop, zero for loops the adjustment doesn't affect. With a region
+    vertex mask, only loops on those vertices are computed. An EdgeGeometry of data, kept from earlier
+    runs, saves recomputing the edges it already holds."""
+    with profile.phase("working set"):
+        working = WorkingSet(data, np.asarray(selected, dtype=bool), region, geometry)
+    return working.scatter(ENGINES[engine](working, params, profile))
+
+
+# Chunked processing
+#################################################
+
+# With a dense selection on a huge mesh, the working set approaches the whole mesh and every intermediate
+# of the engines is sized by it. Splitting the affected vertices into regions bounds that: each region's
+# working set is extracted, adjusted and written out on its own. A loop's normal only depends on the
+# polygons around its vertex, so the combined result is identical to a single run.
+
+# Peak memory of the NumPy engine per working set loop, measured with tracemalloc, plus headroom.
+WORKING_BYTES_PER_LOOP = 512
+
+def get_chunks(data, selected, max_loops, region=None):
+    """Splits the affected vertices (within the region vertex mask, if given) into regions whose working
+    sets hold about max_loops loops each.
+
+    Vertices are ordered island by island (vertices joined by selected edges), so small islands share
+    a chunk whole and large ones are cut into runs of vertices. Returns a list of sorted vertex index arrays."""
+    affected = data.get_affected_vertices(selected)
+    if region is not None:
+        affected &= region
+    vertices = np.flatnonzero(affected)
+    if len(vertices) == 0:
+        return []
+    islands = DisjointSet(data.vertex_count)
+    edges = data.edge_vertices[selected]
+    islands.union(edges[:, 0], edges[:, 1])
+    vertices = vertices[np.lexsort((vertices, islands.find(vertices)))]
+
+    # Each vertex brings the polygons around it, and their loops, into the working set.
+    corners = np.bincount(data.loop_vertex, minlength=data.vertex_count)[vertices]
+    loops_per_polygon = data.loop_count / max(data.poly_count, 1)
+    chunk_ids = (np.cumsum(corners * loops_per_polygon) - 1) // max_loops
+    bounds = np.flatnonzero(np.diff(chunk_ids)) + 1
+    return [np.sort(chunk) for chunk in np.split(vertices, bounds)]
+
+def compute_normals_chunked(data, selected, engine='NUMPY', params=None, memory_budget=1 << 30, workers=1,
+                            profile=NULL_PROFILE, progress=None, geometry=None, region=None):
+    """compute_normals, one bounded region at a time, keeping the engine's peak memory within
+    memory_budget bytes on top of the mesh itself. With several workers, chunks run on threads,
+    splitting the budget between them. With a region vertex mask, only loops on those vertices are computed.
+
+    progress(done, total) is called after every chunk. Returning False from it stops the run, which
+    then returns None."""
+    selected = np.asarray(selected, dtype=bool)
+    max_loops = max(1, memory_budget // (WORKING_BYTES_PER_LOOP * workers))
+    with profile.phase("chunks"):
+        chunks = get_chunks(data, selected, max_loops, region)
+        if len(chunks) > 1:
+            # Indexed once here, so each chunk only touches the loops around its own vertices, and
+            # threads don't race to build them.
+            data.build_topology()
+            data.build_loop_index()
+    profile.count("chunks", len(chunks))
+
+    normals = np.zeros((data.loop_count, 3))
+    def run(vertices, profile=NULL_PROFILE):
+        with profile.phase("working set"):
+            working = WorkingSet(data, selected, geometry=geometry, vertices=vertices)
+        # Regions don't share vertices, so chunks write disjoint loops.
+        working.scatter(ENGINES[engine](working, params, profile), normals)
+
+    def report(done):
+        return progress is None or progress(done, len(chunks)) is not False
+
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run, vertices) for vertices in chunks]
+            for done, future in enumerate(futures, 1):
+                future.result()
+                if not report(done):
+                    for future in futures:
+                        future.cancel()
+                    return None
+    else:
+        for done, vertices in enumerate(chunks, 1):
+            run(vertices, profile)
+            if not report(done):
+                return None
+    return normals
+
+
+# Incremental updates
+#################################################
+
+def get_signature(data, *extra):
+    """Hashes everything besides the edge selection that the adjustment result depends on.
+
+    Two runs with the same signature only differ where their selections differ. Hashing the mesh is the
+    expensive part, so with extra (the engine and parameters, say) this equals
+    extend_signature(get_signature(data), *extra), which callers needing both use instead."""
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (data.vertex_co, data.edge_vertices, data.edge_sharp, data.loop_vertex,
+                  data.loop_edge, data.poly_loop_start, data.poly_loop_total, data.poly_smooth):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(repr(data.auto_smooth_angle).encode())
+    signature = digest.hexdigest()
+    return extend_signature(signature, *extra) if extra else signature
+
+def extend_signature(signature, *extra):
+    """Derives the signature of a mesh with extra from its plain get_signature, without hashing it again."""
+    return hashlib.blake2b((signature + repr(extra)).encode(), digest_size=16).hexdigest()
+
+def get_selection_hash(selected):
+    return hashlib.blake2b(np.packbits(np.asarray(selected, dtype=bool)).tobytes(), digest_size=16).hexdigest()
+
+def get_result_key(signature, selected):
+    """Hashes everything an adjustment result depends on: a get_signature signature (which should
+    include the engine and parameters) and the edge selection."""
+    return hashlib.blake2b((signature + get_selection_hash(selected)).encode(), digest_size=16).hexdigest()
+
+def get_dirty_vertices(data, previous_selected, selected):
+    """Returns a vertex mask of the neighbourhoods a selection change can affect.
+
+    A loop's adjusted normal only depends on the edges around its vertex, so only the vertices at
+    either end of an edge that was selected or deselected need recomputing."""
+    dirty = np.zeros(data.vertex_count, dtype=bool)
+    dirty[data.edge_vertices[previous_selected != selected].ravel()] = True
+    return dirty
+
+def update_normals(data, selected, previous_selected, previous_normals, engine='NUMPY', params=None, profile=NULL_PROFILE,
+                   geometry=None, memory_budget=0, workers=1):
+    """Incremental compute_normals: starts from the normals of a previous run on the same geometry
+    and only recomputes loops around vertices whose edges changed selection since then. A memory_budget
+    in bytes recomputes them with compute_normals_chunked.
+
+    Returns the normals and the dirty vertex mask."""
+    selected = np.asarray(selected, dtype=bool)
+    dirty = get_dirty_vertices(data, previous_selected, selected)
+    normals = np.array(previous_normals, dtype=np.float64).reshape(-1, 3)
+    if dirty.any():
+        loops = dirty[data.loop_vertex]
+        if memory_budget > 0:
+            updated = compute_normals_chunked(data, selected, engine, params, memory_budget, workers, profile,
+                                              geometry=geometry, region=dirty)
+        else:
+            updated = compute_normals(data, selected, engine, dirty, params, profile, geometry)
+        normals[loops] = updated[loops]
+    return normals, dirty
+
+
+# Merging with existing custom normals
+#################################################
+
+def merge_custom_normals(existing, adjusted, previous=None):
+    """Builds the custom normals to write so only the adjustment's loops change.
+
+    existing holds the mesh's current custom normals (zero where a loop has none), adjusted is a
+    compute_normals result and previous the normals the last run wrote, if any. Loops the last run
+    wrote but this one doesn't affect go back to their automatic normal rather than keeping a stale
+    adjustment."""
+    merged = np.array(existing, dtype=np.float32).reshape(-1, 3)
+    if previous is not None:
+        merged[np.any(previous != 0, axis=1)] = 0.0
+    touched = np.any(adjusted != 0, axis=1)
+    merged[touched] = adjusted[touched]
+    return merged
+
+
+# Compact normal storage
+#################################################
+
+# Stored normals use octahedral encoding: two int16 per normal, packed into one int32 so they fit a single
+# INT attribute. The error stays under 1e-4 radians, finer than Blender's own custom normal storage.
+# -32768 doesn't occur in the encoding and marks zero normals (loops the adjustment leaves alone).
+
+OCTAHEDRAL_SCALE = 32767
+OCTAHEDRAL_EMPTY = -32768
+
+def encode_normals(normals):
+    """Packs (N, 3) normals into N int32 values. Zero normals round trip as zero."""
+    normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+    lengths = np.abs(normals).sum(axis=1)
+    empty = lengths == 0
+    projected = normals / np.where(empty, 1.0, lengths)[:, None]
+    x, y, z = projected.T
+
+    # The lower hemisphere folds over the diagonals of the square.
+    sign_x = np.where(x >= 0, 1.0, -1.0)
+    sign_y = np.where(y >= 0, 1.0, -1.0)
+    lower = z < 0
+    x, y = np.where(lower, (1 - np.abs(y)) * sign_x, x), np.where(lower, (1 - np.abs(x)) * sign_y, y)
+
+    u = np.round(x * OCTAHEDRAL_SCALE).astype(np.int32)
+    v = np.round(y * OCTAHEDRAL_SCALE).astype(np.int32)
+    u[empty] = OCTAHEDRAL_EMPTY
+    v[empty] = 0
+    return ((u & 0xFFFF) | (v << 16)).astype(np.int32)
+
+def decode_normals(packed):
+    """Unpacks encode_normals values into (N, 3) unit normals, zero where a zero normal was stored."""
+    packed = np.asarray(packed, dtype=np.int32)
+    u = (packed & 0xFFFF).astype(np.uint16).view(np.int16).astype(np.float64)
+    v = (packed >> 16).astype(np.float64)
+    empty = u == OCTAHEDRAL_EMPTY
+
+    x = u / OCTAHEDRAL_SCALE
+    y = v / OCTAHEDRAL_SCALE
+    z = 1 - np.abs(x) - np.abs(y)
+    fold = np.maximum(-z, 0)
+    x -= np.where(x >= 0, fold, -fold)
+    y -= np.where(y >= 0, fold, -fold)
+
+    normals = np.stack((x, y, z), axis=1)
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    normals[empty] = 0.0
+    return normals
+
+
+# Trim bevel detection
+#################################################
+
+# Bevels get their shading from a band of the trim sheet, so on a finished asset the bevel strips are the
+# polygons mapped into that band, and the trim edges are where those strips meet the faces around them.
+
+def get_polygon_uv_range(data, loop_uv, axis):
+    """Returns the lowest and highest UV coordinate along axis (0 for U, 1 for V) of every polygon."""
+    loops, _ = data.get_polygon_loops(np.arange(data.poly_count))
+    values = np.asarray(loop_uv, dtype=np.float64).reshape(-1, 2)[loops, axis]
+    starts = np.cumsum(data.poly_loop_total) - data.poly_loop_total
+    return np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+def detect_bevel_edges(data, loop_uv, axis=1, band=(0.0, 0.1), angle_range=(math.radians(10), math.radians(80)),
+                       tolerance=1e-4):
+    """Returns a per-edge mask of the edges bounding bevel strips, or None without one UV per loop.
+
+    Those are the manifold edges between a polygon lying entirely inside the UV band along axis and
+    one that doesn't, whose polygons meet at an angle within angle_range."""
+    if loop_uv is None or len(loop_uv) != data.loop_count:
+        return None
+    if data.poly_count == 0:
+        return np.zeros(data.edge_count, dtype=bool)
+    if data.edge_polygons is None:
+        data.build_topology()
+    low, high = get_polygon_uv_range(data, loop_uv, axis)
+    in_band = (low >= band[0] - tolerance) & (high <= band[1] + tolerance)
+
+    edges = np.flatnonzero(data.edge_polygons[:, 0] >= 0)
+    polys = data.edge_polygons[edges]
+    edges = edges[in_band[polys[:, 0]] != in_band[polys[:, 1]]]
+    angles = get_edge_angles(data, edges)
+    detected = np.zeros(data.edge_count, dtype=bool)
+    detected[edges[(angles >= angle_range[0]) & (angles <= angle_range[1])]] = True
+    return detected
+
+
+# Meshes without Blender
+#################################################
+
+def sum_by_polygon(values, loop_poly, poly_count):
+    """Sums per-loop vectors into per-polygon vectors."""
+    return np.stack([np.bincount(loop_poly, weights=values[:, i], minlength=poly_count) for i in range(3)], axis=1)
+
+def build_mesh_data(vertex_co, loop_vertex, poly_loop_total, auto_smooth_angle, sharp_edges=None):
+    """Builds a MeshData from plain polygon lists, deriving what Blender would otherwise provide:
+    edges, polygon normals and auto smooth split normals.
+
+    loop_vertex lists each polygon's vertices in order, poly_loop_total how many belong to each
+    polygon, and sharp_edges is an optional (n, 2) array of vertex pairs to mark sharp."""
+    vertex_co = np.asarray(vertex_co, dtype=np.float64).reshape(-1, 3)
+    loop_vertex = np.asarray(loop_vertex, dtype=np.int64)
+    poly_loop_total = np.asarray(poly_loop_total, dtype=np.int64)
+    poly_loop_start = np.cumsum(poly_loop_total) - poly_loop_total
+    vertex_count = len(vertex_co)
+
+    # A loop's edge runs from its vertex to the next loop's vertex.
+    start = np.repeat(poly_loop_start, poly_loop_total)
+    total = np.repeat(poly_loop_total, poly_loop_total)
+    next_vertex = loop_vertex[start + (np.arange(len(loop_vertex)) - start + 1) % total]
+    keys = np.minimum(loop_vertex, next_vertex) * vertex_count + np.maximum(loop_vertex, next_vertex)
+    edge_keys, loop_edge = np.unique(keys, return_inverse=True)
+    edge_vertices = np.stack((edge_keys // vertex_count, edge_keys % vertex_count), axis=1)
+
+    edge_sharp = np.zeros(len(edge_keys), dtype=bool)
+    if sharp_edges is not None and len(sharp_edges) > 0:
+        sharp_edges = np.asarray(sharp_edges, dtype=np.int64).reshape(-1, 2)
+        sharp_keys = sharp_edges.min(axis=1) * vertex_count + sharp_edges.max(axis=1)
+        edge_sharp = np.isin(edge_keys, sharp_keys)
+
+    # Newell's method, like Blender's polygon normals.
+    loop_poly = np.repeat(np.arange(len(poly_loop_total)), poly_loop_total)
+    poly_normal = sum_by_polygon(np.cross(vertex_co[loop_vertex], vertex_co[next_vertex]), loop_poly, len(poly_loop_total))
+    poly_normal /= np.maximum(np.linalg.norm(poly_normal, axis=1), 1e-12)[:, None]
+
+    data = MeshData(vertex_co, edge_vertices, edge_sharp, loop_vertex, loop_edge, np.zeros((len(loop_vertex), 3)),
+                    poly_loop_start, poly_loop_total, poly_normal, auto_smooth_angle)
+    data.loop_normal = compute_split_normals(data)
+    return data
+
+def compute_split_normals(data):
+    """Auto smooth split normals, as calc_normals_split computes them without custom normals.
+
+    Each fan of corners joined by smooth edges gets the corner-angle weighted average of its polygon normals.
+    Every edge of a flat shaded polygon is split, and its corners get the polygon normal."""
+    data.build_topology()
+    previous_loops, next_loops = data.get_adjacent_loops()
+    corner = data.vertex_co[data.loop_vertex]
+    angles = get_angles(data.vertex_co[data.loop_vertex[previous_loops]] - corner,
+                        data.vertex_co[data.loop_vertex[next_loops]] - corner)
+    normals = data.poly_normal[data.loop_poly] * angles[:, None]
+
+    smooth_edges = classify_smooth_edges(data, np.zeros(data.edge_count, dtype=bool))
+    everything = np.ones(data.vertex_count, dtype=bool)
+    average_groups(normals, *get_smoothing_groups(data, smooth_edges, everything))
+    flat = ~data.poly_smooth[data.loop_poly]
+    normals[flat] = data.poly_normal[data.loop_poly[flat]]
+    return normals
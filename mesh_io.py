@@ -0,0 +1,231 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+# Thin adapter between bpy meshes and the kernel's MeshData, using bulk foreach_get/foreach_set only.
+
+from contextlib import contextmanager
+
+import bmesh
+import bpy
+import numpy as np
+
+from .edge_masks import get_vertex_mask
+from .kernel import MeshData, decode_normals, encode_normals
+
+def read_array(collection, attr, dtype, width=1):
+    """Bulk-read a bpy collection property into a NumPy array with foreach_get."""
+    values = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attr, values)
+    return values.reshape(-1, width) if width > 1 else values
+
+def read_mesh(mesh):
+    """Copies everything the kernel needs out of a bpy.types.Mesh. Expects calc_normals_split to have run."""
+    return MeshData(
+        vertex_co=read_array(mesh.vertices, "co", np.float32, 3),
+        edge_vertices=read_array(mesh.edges, "vertices", np.int32, 2),
+        edge_sharp=read_array(mesh.edges, "use_edge_sharp", bool),
+        loop_vertex=read_array(mesh.loops, "vertex_index", np.int32),
+        loop_edge=read_array(mesh.loops, "edge_index", np.int32),
+        loop_normal=read_array(mesh.loops, "normal", np.float32, 3),
+        poly_loop_start=read_array(mesh.polygons, "loop_start", np.int32),
+        poly_loop_total=read_array(mesh.polygons, "loop_total", np.int32),
+        poly_normal=read_array(mesh.polygons, "normal", np.float32, 3),
+        auto_smooth_angle=mesh.auto_smooth_angle,
+        poly_smooth=read_array(mesh.polygons, "use_smooth", bool),
+    )
+
+def read_selected_edges(mesh):
+    return read_array(mesh.edges, "select", bool)
+
+
+def write_custom_normals(mesh, normals):
+    mesh.normals_split_custom_set(np.ascontiguousarray(normals, dtype=np.float32))
+
+# Edit Mode access
+#################################################
+
+# Switching between Object and Edit Mode converts the whole mesh each way. Instead, reads sync the edit
+# BMesh into the mesh once with update_from_editmode and use foreach_get as usual, and writes go straight
+# to the BMesh, touching only the elements that change.
+#
+# Attribute and UV data read as empty while the mesh is in Edit Mode, even after syncing, so they're read
+# from a temporary copy of the synced mesh, which isn't in Edit Mode. The copy costs little next to the
+# sync: benchmarks/edit_mode.py measures this at under half the time of a Python pass over the BMesh, and
+# under a third of a mode switch and back. Attributes are written through BMesh layers, which only come
+# in INT (not BOOLEAN) for edges, hence INT masks.
+#
+# Reads expect sync_edit_mesh to have run since the last BMesh write.
+
+def sync_edit_mesh(obj):
+    """Brings obj.data up to date with its edit-mode BMesh without leaving Edit Mode, and returns it."""
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+    return obj.data
+
+def write_edit_selection(mesh, selected, current):
+    """Applies an edge selection to the edit-mode BMesh: exactly the selected edges and their vertices,
+    and no faces. current holds the edges' selection in the synced mesh.
+
+    Deselecting a face or edge also deselects its vertices, and flushing would add or drop edges around
+    them, so nothing is flushed: faces, edges and vertices leaving the selection are deselected first,
+    then every selected edge at one of their vertices is selected again. Only those elements are touched."""
+    edge_vertices = read_array(mesh.edges, "vertices", np.int32, 2)
+    vertices = get_vertex_mask(edge_vertices, selected, len(mesh.vertices))
+    current_vertices = read_array(mesh.vertices, "select", bool)
+
+    bm = bmesh.from_edit_mesh(mesh)
+    bm.verts.ensure_lookup_table()
+    bm.edges.ensure_lookup_table()
+    bm.faces.ensure_lookup_table()
+    touched = np.zeros(len(vertices), dtype=bool)
+    for i in np.flatnonzero(read_array(mesh.polygons, "select", bool)).tolist():
+        face = bm.faces[i]
+        face.select_set(False)
+        touched[[v.index for v in face.verts]] = True
+    deselected = np.flatnonzero(current & ~selected)
+    for i in deselected.tolist():
+        bm.edges[i].select_set(False)
+    touched[edge_vertices[deselected].ravel()] = True
+    for i in np.flatnonzero(current_vertices & ~vertices).tolist():
+        bm.verts[i].select_set(False)
+    reselected = selected & (~current | touched[edge_vertices].any(axis=1))
+    for i in np.flatnonzero(reselected).tolist():
+        bm.edges[i].select_set(True)
+    bmesh.update_edit_mesh(mesh)
+
+@contextmanager
+def edit_mesh_copy(mesh):
+    """Yields a temporary copy of a synced edit-mode mesh, whose attribute and UV data can be read."""
+    copy = mesh.copy()
+    try:
+        yield copy
+    finally:
+        bpy.data.meshes.remove(copy)
+
+def read_mesh_edge_layer(mesh, name):
+    """Reads an INT edge attribute of a mesh outside Edit Mode, or zeros if it doesn't exist."""
+    attr = mesh.attributes.get(name)
+    if attr is None:
+        return np.zeros(len(mesh.edges), dtype=np.int32)
+    return read_array(attr.data, "value", np.int32)
+
+def read_edit_edge_layer(mesh, name):
+    """Reads an INT edge attribute of a synced edit-mode mesh, or zeros if it doesn't exist."""
+    with edit_mesh_copy(mesh) as copy:
+        return read_mesh_edge_layer(copy, name)
+
+def write_edit_edge_layer(mesh, name, values, current=None):
+    """Writes an INT edge attribute through the edit-mode BMesh, touching only the values that differ from
+    current, read from the synced mesh unless the caller passes it in."""
+    if current is None:
+        current = read_edit_edge_layer(mesh, name)
+    bm = bmesh.from_edit_mesh(mesh)
+    layer = bm.edges.layers.int.get(name)
+    if layer is None:
+        layer = bm.edges.layers.int.new(name)
+    bm.edges.ensure_lookup_table()
+    for i in np.flatnonzero(values != current).tolist():
+        bm.edges[i][layer] = int(values[i])
+    bmesh.update_edit_mesh(mesh)
+
+def read_mesh_loop_uvs(mesh):
+    """Reads the active UV map of a mesh outside Edit Mode, one (u, v) per loop, or None without one."""
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is None:
+        return None
+    return read_array(uv_layer.data, "uv", np.float32, 2)
+
+def read_loop_uvs(obj):
+    """Reads the active UV map in either mode, one (u, v) per loop, or None when the mesh has no UV map.
+
+    UV maps are corner attributes, so in Edit Mode they're read from a copy like other attributes."""
+    if obj.mode == 'EDIT':
+        with edit_mesh_copy(obj.data) as copy:
+            return read_mesh_loop_uvs(copy)
+    return read_mesh_loop_uvs(obj.data)
+
+def read_edge_layer(obj, name):
+    """Reads an INT edge attribute in either mode, or zeros if it doesn't exist."""
+    if obj.mode == 'EDIT':
+        return read_edit_edge_layer(obj.data, name)
+    return read_mesh_edge_layer(obj.data, name)
+
+def write_edge_layer(obj, name, values, current=None):
+    """Writes an INT edge attribute in either mode. current, the values read_edge_layer last returned,
+    saves reading them again in Edit Mode."""
+    values = np.ascontiguousarray(values, dtype=np.int32)
+    if obj.mode == 'EDIT':
+        write_edit_edge_layer(obj.data, name, values, current)
+    else:
+        get_attribute(obj.data, name, 'INT', 'EDGE').data.foreach_set("value", values)
+
+
+def get_attribute(mesh, name, data_type, domain):
+    """Returns the named mesh attribute, (re)creating it if it's missing or has the wrong type."""
+    attr = mesh.attributes.get(name)
+    if attr is not None and (attr.data_type != data_type or attr.domain != domain):
+        mesh.attributes.remove(attr)
+        attr = None
+    if attr is None:
+        attr = mesh.attributes.new(name, data_type, domain)
+    return attr
+
+
+# Previous run storage for incremental updates and the result cache
+#################################################
+
+PREVIOUS_EDGE_ATTRIBUTE = 'trimsheet_prev_edge'
+# Octahedral encoded, see kernel.encode_normals. Older versions stored a FLOAT_VECTOR attribute, which
+# is ignored on read and replaced on the next store.
+PREVIOUS_NORMAL_ATTRIBUTE = 'trimsheet_normal'
+SIGNATURE_PROPERTY = 'trimsheet_signature'
+RESULT_KEY_PROPERTY = 'trimsheet_result'
+
+def read_previous_run(mesh, signature):
+    """Returns (selected, normals) stored by the last run, or None if there isn't one for this signature."""
+    if mesh.get(SIGNATURE_PROPERTY) != signature:
+        return None
+    edges = mesh.attributes.get(PREVIOUS_EDGE_ATTRIBUTE)
+    normals = read_previous_normals(mesh)
+    if edges is None or normals is None:
+        return None
+    return read_array(edges.data, "value", bool), normals
+
+def read_previous_normals(mesh):
+    """Returns the custom normals the last run wrote (zero where it left loops alone), or None."""
+    normals = mesh.attributes.get(PREVIOUS_NORMAL_ATTRIBUTE)
+    if normals is None or normals.data_type != 'INT' or len(normals.data) != len(mesh.loops):
+        return None
+    return decode_normals(read_array(normals.data, "value", np.int32))
+
+def read_cached_result(mesh, result_key):
+    """Returns the normals stored by the last run if its kernel.get_result_key matches, or None."""
+    if mesh.get(RESULT_KEY_PROPERTY) != result_key:
+        return None
+    return read_previous_normals(mesh)
+
+def store_run(mesh, signature, selected, normals, result_key):
+    """Stores this run's selection and computed normals next to the saved trim edges for the next run."""
+    get_attribute(mesh, PREVIOUS_EDGE_ATTRIBUTE, 'BOOLEAN', 'EDGE').data.foreach_set("value", selected)
+    attr = get_attribute(mesh, PREVIOUS_NORMAL_ATTRIBUTE, 'INT', 'CORNER')
+    attr.data.foreach_set("value", encode_normals(normals))
+    mesh[SIGNATURE_PROPERTY] = signature
+    mesh[RESULT_KEY_PROPERTY] = result_key
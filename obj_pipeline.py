@@ -0,0 +1,240 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Command line batch adjustment of OBJ files, without Blender:
+#
+#   python -m TrimNormals.obj_pipeline assets/ --output build/ --jobs 8
+#
+# Trim edges come from a sidecar edge list next to each OBJ (name.edges, one "a b" pair of 1-based
+# OBJ vertex indices per line), or from the OBJ itself: smoothing group boundaries or UV seams.
+# The adjusted normals are written back as vn records referenced from every face.
+
+import argparse
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import kernel
+
+class ObjMesh:
+    """The parts of an OBJ file the adjustment needs, plus its other lines to pass through unchanged."""
+    def __init__(self):
+        self.vertex_co = list()
+        self.loop_vertex = list()
+        self.loop_uv = list()
+        self.poly_loop_total = list()
+        self.poly_smooth_group = list()
+        self.header = list()
+        self.lines = list()
+
+def parse_index(token, count):
+    """OBJ indices are 1-based, and negative ones count back from the most recent element."""
+    index = int(token)
+    return index - 1 if index > 0 else count + index
+
+def read_obj(path):
+    obj = ObjMesh()
+    uv_count = 0
+    smooth_group = 1
+    smooth_groups = dict()
+    with open(path, "r") as f:
+        for line in f:
+            tag, _, rest = line.strip().partition(" ")
+            if tag == "v":
+                obj.vertex_co.append([float(x) for x in rest.split()[:3]])
+            elif tag == "vt":
+                uv_count += 1
+            elif tag == "vn":
+                # Replaced by the adjusted normals.
+                continue
+            elif tag == "s":
+                rest = rest.strip()
+                smooth_group = 0 if rest in ("off", "0") else smooth_groups.setdefault(rest, len(smooth_groups) + 1)
+            elif tag == "f":
+                corners = rest.split()
+                for corner in corners:
+                    parts = corner.split("/")
+                    obj.loop_vertex.append(parse_index(parts[0], len(obj.vertex_co)))
+                    obj.loop_uv.append(parse_index(parts[1], uv_count) if len(parts) > 1 and parts[1] else -1)
+                obj.poly_loop_total.append(len(corners))
+                obj.poly_smooth_group.append(smooth_group)
+                # Faces are rewritten on output; keep their position among the other lines.
+                obj.lines.append(None)
+                continue
+            if len(obj.poly_loop_total) == 0:
+                obj.header.append(line)
+            else:
+                obj.lines.append(line)
+    return obj
+
+def get_polygon_pairs(data):
+    """Returns the manifold edges and, for each, the loops of both polygons at each end of the edge."""
+    data.build_topology()
+    edges = np.flatnonzero(data.edge_polygons[:, 0] >= 0)
+    corner_keys = data.loop_poly * data.vertex_count + data.loop_vertex
+    order = np.argsort(corner_keys)
+    ends = list()
+    for end in range(2):
+        vertices = data.edge_vertices[edges, end]
+        loops_a = order[np.searchsorted(corner_keys[order], data.edge_polygons[edges, 0] * data.vertex_count + vertices)]
+        loops_b = order[np.searchsorted(corner_keys[order], data.edge_polygons[edges, 1] * data.vertex_count + vertices)]
+        ends.append((loops_a, loops_b))
+    return edges, ends
+
+def get_smoothing_boundaries(data, poly_smooth_group):
+    """Edges between polygons in different smoothing groups, or touching a flat shaded (s off) polygon."""
+    data.build_topology()
+    boundaries = np.zeros(data.edge_count, dtype=bool)
+    edges = np.flatnonzero(data.edge_polygons[:, 0] >= 0)
+    groups = poly_smooth_group[data.edge_polygons[edges]]
+    boundaries[edges] = (groups[:, 0] != groups[:, 1]) | (groups[:, 0] == 0) | (groups[:, 1] == 0)
+    return boundaries
+
+def get_uv_seams(data, loop_uv):
+    """Edges whose two polygons use different UVs at either end."""
+    seams = np.zeros(data.edge_count, dtype=bool)
+    edges, ends = get_polygon_pairs(data)
+    for loops_a, loops_b in ends:
+        seams[edges] |= loop_uv[loops_a] != loop_uv[loops_b]
+    return seams
+
+def read_edge_list(path, data):
+    """Reads a sidecar list of 1-based vertex index pairs into a per-edge mask."""
+    pairs = np.loadtxt(path, dtype=np.int64, ndmin=2).reshape(-1, 2) - 1
+    keys = pairs.min(axis=1) * data.vertex_count + pairs.max(axis=1)
+    edge_keys = data.edge_vertices.min(axis=1) * data.vertex_count + data.edge_vertices.max(axis=1)
+    return np.isin(edge_keys, keys)
+
+def get_trim_edges(obj, data, path, source):
+    sidecar = os.path.splitext(path)[0] + ".edges"
+    if source == 'sidecar' or (source == 'auto' and os.path.exists(sidecar)):
+        return read_edge_list(sidecar, data)
+    if source == 'seams':
+        return get_uv_seams(data, np.asarray(obj.loop_uv))
+    return get_smoothing_boundaries(data, np.asarray(obj.poly_smooth_group))
+
+def write_obj(path, obj, loop_normals):
+    # Share identical normals between corners so the vn block stays small.
+    normals, loop_normal_index = np.unique(np.round(loop_normals, 6), axis=0, return_inverse=True)
+    loop_normal_index = loop_normal_index.ravel()
+
+    with open(path, "w") as f:
+        f.writelines(obj.header)
+        f.writelines("vn {:.6f} {:.6f} {:.6f}\n".format(*n) for n in normals.tolist())
+
+        loop = 0
+        poly = 0
+        for line in obj.lines:
+            if line is not None:
+                f.write(line)
+                continue
+            corners = list()
+            for _ in range(obj.poly_loop_total[poly]):
+                uv = obj.loop_uv[loop]
+                corners.append("{}/{}/{}".format(obj.loop_vertex[loop] + 1, uv + 1 if uv >= 0 else "", loop_normal_index[loop] + 1))
+                loop += 1
+            f.write("f " + " ".join(corners) + "\n")
+            poly += 1
+
+def process_file(path, output, source, smooth_angle):
+    """Adjusts one OBJ file. Returns (path, loop count, seconds)."""
+    start = time.perf_counter()
+    obj = read_obj(path)
+    if len(obj.poly_loop_total) == 0:
+        # Nothing to adjust without faces, so the file passes through unchanged.
+        shutil.copyfile(path, output)
+        return path, 0, time.perf_counter() - start
+
+    # Smoothing group boundaries are sharp, like Blender's OBJ importer marks them.
+    data = kernel.build_mesh_data(obj.vertex_co, obj.loop_vertex, obj.poly_loop_total, smooth_angle)
+    data.edge_sharp = get_smoothing_boundaries(data, np.asarray(obj.poly_smooth_group))
+    data.loop_normal = kernel.compute_split_normals(data)
+
+    selected = get_trim_edges(obj, data, path, source)
+    custom = kernel.compute_normals(data, selected)
+
+    # Loops the adjustment leaves alone keep their automatic split normal.
+    affected = np.linalg.norm(custom, axis=1) > 0
+    loop_normals = data.loop_normal.copy()
+    loop_normals[affected] = custom[affected] / np.linalg.norm(custom[affected], axis=1)[:, None]
+
+    write_obj(output, obj, loop_normals)
+    return path, data.loop_count, time.perf_counter() - start
+
+def iter_obj_files(paths, skip_suffix=None):
+    """Yields (path, path relative to the directory searched) for the OBJ files in paths. Found in a
+    directory, files ending in skip_suffix + ".obj" are left out: they're results of an earlier run."""
+    skip = None if skip_suffix is None else (skip_suffix + ".obj").lower()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(".obj") and (skip is None or not name.lower().endswith(skip)):
+                        yield os.path.join(root, name), os.path.relpath(os.path.join(root, name), path)
+        else:
+            yield path, os.path.basename(path)
+
+def get_output_path(path, relative, output, suffix):
+    if output is None:
+        root, ext = os.path.splitext(path)
+        return root + suffix + ext
+    target = os.path.join(output, relative)
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    return target
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Adjust trim sheet normals in OBJ files without Blender.")
+    parser.add_argument("paths", nargs="+", help="OBJ files or directories to search for them")
+    parser.add_argument("-o", "--output", help="Directory to write results to, mirroring the input layout")
+    parser.add_argument("--suffix", default=".trim", help="Suffix for results written next to their input (default: .trim)")
+    parser.add_argument("--trim-edges", choices=['auto', 'sidecar', 'smoothing', 'seams'], default='auto',
+                        help="Where trim edges come from; auto uses a name.edges sidecar if present, else smoothing groups")
+    parser.add_argument("--smooth-angle", type=float, default=30.0, help="Auto smooth angle in degrees (default: 30)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="Files to process concurrently")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    total_loops = 0
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(process_file, path, get_output_path(path, relative, args.output, args.suffix),
+                               args.trim_edges, math.radians(args.smooth_angle)): path
+                   for path, relative in iter_obj_files(args.paths, args.suffix if args.output is None else None)}
+        for future, path in futures.items():
+            try:
+                path, loops, seconds = future.result()
+            except Exception as e:
+                failures += 1
+                print("FAILED {}: {}".format(path, e), file=sys.stderr)
+                continue
+            total_loops += loops
+            print("{}: {} loops in {:.3f}s ({:.0f} loops/s)".format(path, loops, seconds, loops / max(seconds, 1e-9)))
+
+    elapsed = time.perf_counter() - start
+    print("{} files, {} loops in {:.2f}s ({:.0f} loops/s)".format(len(futures), total_loops, elapsed, total_loops / max(elapsed, 1e-9)))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
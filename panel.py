@@ -20,6 +20,17 @@
 
 import bpy
 
+from . import background_operator
+from . import profiling
+
+class TrimNormalsEdgeSetList(bpy.types.UIList):
+    bl_idname = 'TRIMNORMALS_UL_edge_sets'
+
+    def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
+        row = layout.row(align=True)
+        row.prop(item, "use", text="")
+        row.prop(item, "name", text="", emboss=False)
+
 class TrimNormalsPanel(bpy.types.Panel):
     bl_idname = 'VIEW3D_PT_panel'
     bl_space_type = 'VIEW_3D'
@@ -33,9 +44,28 @@ class TrimNormalsPanel(bpy.types.Panel):
         col.label(text='Selection')
         col.operator('opr.trim_normals_select_seams')
         col.operator('opr.trim_normals_select_sharp')
+        combined = col.operator('opr.trim_normals_select_combined', text='Select Seams or Sharp')
+        combined.sources = {'SEAMS', 'SHARP'}
+        combined.combine = 'OR'
+        col.operator('opr.trim_normals_detect_bevels')
         col.separator()
-        col.operator('opr.trim_normals_save_selected')
-        col.operator('opr.trim_normals_restore_saved')
+
+        obj = context.active_object
+        if obj is not None and obj.type == 'MESH':
+            col.label(text='Edge Sets')
+            row = col.row()
+            row.template_list('TRIMNORMALS_UL_edge_sets', '', obj.data, 'trim_normals_edge_sets',
+                              obj.data, 'trim_normals_edge_set_index', rows=3)
+            buttons = row.column(align=True)
+            buttons.operator('opr.trim_normals_add_edge_set', icon='ADD', text='')
+            buttons.operator('opr.trim_normals_remove_edge_set', icon='REMOVE', text='')
+
+        row = col.row(align=True)
+        row.operator('opr.trim_normals_save_selected', text='Save')
+        row.operator('opr.trim_normals_restore_saved', text='Restore')
+        row = col.row(align=True)
+        row.operator('opr.trim_normals_select_edge_sets', text='Union').combine = 'OR'
+        row.operator('opr.trim_normals_select_edge_sets', text='Intersect').combine = 'AND'
 
         col.label(text='Modify Mesh')
         col.operator('mesh.customdata_custom_splitnormals_clear', text="Clear Custom Split Normals")
@@ -43,8 +73,48 @@ class TrimNormalsPanel(bpy.types.Panel):
         adjust = col.row()
         adjust.scale_y = 2.0
         adjust.operator('opr.trim_normals_adjust_operator')
+        reference = col.operator('opr.trim_normals_adjust_operator', text='Adjust (Python Reference)')
+        reference.engine = 'PYTHON'
+        col.operator('opr.trim_normals_background_adjust', text='Adjust in Background')
+        for name, job in background_operator.jobs.items():
+            col.label(text='{}: {:.0%} (Esc to cancel)'.format(name, job.progress), icon='TIME')
+        col.operator('opr.trim_normals_batch_adjust_operator')
+        col.operator('opr.trim_normals_batch_adjust_operator', text='Batch Adjust Scene').targets = 'SCENE'
         pass
 
 
+class TrimNormalsProfilePanel(bpy.types.Panel):
+    bl_idname = 'VIEW3D_PT_trim_normals_profile'
+    bl_parent_id = 'VIEW3D_PT_panel'
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = 'Trim Normals'
+    bl_label = 'Timings'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        col = self.layout.column()
+        settings = context.scene.trim_normals_profile
+        col.prop(settings, "report")
+        col.prop(settings, "use_cprofile")
+
+        profile = profiling.last_profile
+        if profile is None:
+            col.label(text='No runs yet')
+            return
+
+        col.separator()
+        col.label(text='{}: {:.1f} ms'.format(profile.name, profile.total * 1000))
+        for name, seconds in profile.phases.items():
+            row = col.row()
+            row.label(text=name)
+            row.label(text='{:.1f} ms'.format(seconds * 1000))
+        for name, value in profile.counters.items():
+            row = col.row()
+            row.label(text=name)
+            row.label(text=str(value))
+        col.operator('opr.trim_normals_export_profile')
+
+
 def register():
     pass
@@ -0,0 +1,84 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+
+import bpy
+from bpy_extras.io_utils import ExportHelper
+
+from . import profiling
+
+class TrimNormalsProfileSettings(bpy.types.PropertyGroup):
+    report: bpy.props.BoolProperty(
+        name="Report Timings",
+        description="Add each run's phase timings and counters to the operator report",
+        default=False,
+    )
+
+    use_cprofile: bpy.props.BoolProperty(
+        name="Use cProfile",
+        description="Also run the operators under cProfile; slows them down, printing the hottest calls to the console",
+        default=False,
+    )
+
+def get_settings(context):
+    return context.scene.trim_normals_profile
+
+def begin_profile(context, name):
+    """Starts timing one operator run according to the scene's profiling settings."""
+    return profiling.Profile(name, get_settings(context).use_cprofile).start()
+
+def end_profile(operator, context, profile):
+    """Stops the run's profile, keeps it for the panel and export, and reports it if asked to."""
+    profile.stop()
+    profiling.last_profile = profile
+
+    stats = profile.get_stats()
+    if stats is not None:
+        print(stats)
+    if get_settings(context).report:
+        operator.report({'INFO'}, "{} {}".format(profile.name, profile.get_summary()))
+
+class TrimNormalsExportProfileOperator(bpy.types.Operator, ExportHelper):
+    bl_idname = 'opr.trim_normals_export_profile'
+    bl_label = 'Export Timings'
+    bl_description = 'Write the last run\'s timings and counters to a JSON file, along with its cProfile data if recorded'
+
+    filename_ext = ".json"
+
+    filter_glob: bpy.props.StringProperty(default="*.json", options={'HIDDEN'})
+
+    @classmethod
+    def poll(cls, context):
+        return profiling.last_profile is not None
+
+    def execute(self, context):
+        profile = profiling.last_profile
+        with open(self.filepath, "w") as f:
+            f.write(profile.to_json())
+        if profile.profiler is not None:
+            profile.dump_stats(os.path.splitext(self.filepath)[0] + ".prof")
+        return { 'FINISHED' }
+
+def register():
+    bpy.types.Scene.trim_normals_profile = bpy.props.PointerProperty(type=TrimNormalsProfileSettings)
+
+def unregister():
+    del bpy.types.Scene.trim_normals_profile
@@ -0,0 +1,117 @@
+# Copyright (c) 2023 Level Set Studio LLC
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Per-phase timings and counters for one operator run. Kept free of bpy so the kernel can record
+# into a Profile wherever it runs; profile_operator has the Blender side (settings, export).
+
+import cProfile
+import io
+import json
+import pstats
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+class Profile:
+    """Wall time per named phase and named counters, in the order they were first recorded.
+
+    Phases and counters with the same name accumulate. With use_cprofile, everything between start
+    and stop also runs under cProfile."""
+    enabled = True
+
+    def __init__(self, name, use_cprofile=False):
+        self.name = name
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+        self.profiler = cProfile.Profile() if use_cprofile else None
+        self.started = None
+        self.total = 0.0
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+        return self
+
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.total = time.perf_counter() - self.started
+        return self
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def get_stats(self, limit=30):
+        """Returns the cProfile report sorted by cumulative time, or None without cProfile."""
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def dump_stats(self, path):
+        self.profiler.dump_stats(path)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "total": self.total,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+            "stats": self.get_stats(),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def get_summary(self):
+        """One line for the operator report: the total, then the phases slowest first, then the counters."""
+        phases = sorted(self.phases.items(), key=lambda item: item[1], reverse=True)
+        parts = ["{} {:.1f}ms".format(name, seconds * 1000) for name, seconds in phases]
+        parts += ["{} {}".format(name, value) for name, value in self.counters.items()]
+        return "{:.1f}ms: {}".format(self.total * 1000, ", ".join(parts))
+
+class NullProfile(Profile):
+    """Records nothing, for callers that don't want timings."""
+    enabled = False
+
+    def __init__(self):
+        super().__init__("")
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def count(self, name, value=1):
+        pass
+
+NULL_PROFILE = NullProfile()
+
+# The most recent finished run, shown in the panel and exported on request.
+last_profile = None
@@ -18,41 +18,42 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import math
+
 import bpy
-import bmesh
 
-def get_save_collection(mesh):
-    attr = mesh.attributes.get('trimsheet_edge')
-    if not attr:
-        attr = mesh.attributes.new('trimsheet_edge', 'BOOLEAN', 'EDGE')
-    return attr
+from . import profile_operator
+
+class TrimNormalsEdgeSet(bpy.types.PropertyGroup):
+    """A named set of trim edges: those with bit index set in the saved edge attribute."""
+    index: bpy.props.IntProperty(
+        name="Bit",
+        description="Bit of the saved edge attribute holding this set",
+        min=0,
+        max=31,
+    )
+
+    use: bpy.props.BoolProperty(
+        name="Combine",
+        description="Include this set when selecting the union or intersection of sets",
+        default=False,
+    )
 
-def get_saved_edges(context):
-    mode = context.active_object.mode
-    marked = set()
+def run_select_edges_from(operator, context, sources, combine='OR', invert=False):
+    """select_edges_from, timed for the profiling panel."""
+    from . import edge_selection
+    profile = profile_operator.begin_profile(context, operator.bl_label)
     try:
-        bpy.ops.object.mode_set(mode='OBJECT')
-        attr = get_save_collection(context.active_object.data)
-        for i in range(len(attr.data)):
-            if getattr(attr.data[i], "value"):
-                marked.add(i)
+        edge_selection.select_edges_from(context, sources, combine, invert, profile)
     finally:
-        bpy.ops.object.mode_set(mode=mode)
-    return marked
-        
+        profile_operator.end_profile(operator, context, profile)
+
 class TrimNormalsSelectSeamsOperator(bpy.types.Operator):
     bl_idname = 'opr.trim_normals_select_seams'
     bl_label = 'Select Seams'
     
     def execute(self, context):
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.ops.object.mode_set(mode='OBJECT')
-
-        for e in context.active_object.data.edges:
-            e.select = e.use_seam
-
-        bpy.ops.object.mode_set(mode='EDIT')
+        run_select_edges_from(self, context, {'SEAMS'})
         return { 'FINISHED' }
     
 class TrimNormalsSelectSharpOperator(bpy.types.Operator):
@@ -60,44 +61,209 @@ class TrimNormalsSelectSharpOperator(bpy.types.Operator):
     bl_label = 'Select Sharp'
     
     def execute(self, context):
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.ops.object.mode_set(mode='OBJECT')
+        run_select_edges_from(self, context, {'SHARP'})
+        return { 'FINISHED' }
+
+class TrimNormalsSelectCombinedOperator(bpy.types.Operator):
+    bl_idname = 'opr.trim_normals_select_combined'
+    bl_label = 'Select Combined'
+    bl_description = 'Select edges from a combination of seams, sharp edges, the saved selection and the current selection'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    sources: bpy.props.EnumProperty(
+        name="Sources",
+        items=[
+            ('SEAMS', "Seams", "Edges marked as UV seams"),
+            ('SHARP', "Sharp", "Edges marked as sharp"),
+            ('SAVED', "Saved", "The active saved edge set"),
+            ('SELECTED', "Selected", "The current edge selection"),
+        ],
+        options={'ENUM_FLAG'},
+        default={'SEAMS', 'SHARP'},
+    )
+
+    combine: bpy.props.EnumProperty(
+        name="Combine",
+        items=[
+            ('OR', "Union", "Select edges in any of the sources"),
+            ('AND', "Intersection", "Select edges in all of the sources"),
+        ],
+        default='OR',
+    )
 
-        for e in context.active_object.data.edges:
-            e.select = e.use_edge_sharp
+    invert: bpy.props.BoolProperty(
+        name="Invert",
+        description="Select the edges that don't match instead",
+        default=False,
+    )
 
-        bpy.ops.object.mode_set(mode='EDIT')
+    def execute(self, context):
+        run_select_edges_from(self, context, self.sources, self.combine, self.invert)
         return { 'FINISHED' }
 
 class TrimNormalsSaveSelectedOperator(bpy.types.Operator):
     bl_idname = 'opr.trim_normals_save_selected'
     bl_label = 'Save Selection'
+    bl_description = 'Save the selected edges into the active edge set'
+    bl_options = {'REGISTER', 'UNDO'}
 
     def execute(self, context):
-        mesh = context.active_object.data
-
-        mode = context.active_object.mode
+        from . import edge_selection, mesh_io
+        profile = profile_operator.begin_profile(context, self.bl_label)
         try:
-            bpy.ops.object.mode_set(mode='OBJECT')
-            attr = get_save_collection(mesh)
-            attr.data.foreach_set("value", [e.select for e in mesh.edges])
+            obj = context.active_object
+            with profile.phase("sync"):
+                mesh = mesh_io.sync_edit_mesh(obj)
+                edge_set = edge_selection.get_active_set(obj)
+            with profile.phase("read"):
+                selected = mesh_io.read_selected_edges(mesh)
+            with profile.phase("write"):
+                if edge_set is None:
+                    edge_selection.add_edge_set(obj, edge_selection.LEGACY_SET_NAME, selected)
+                else:
+                    edge_selection.save_edge_set(obj, edge_set, selected)
+            profile.count("edges saved", selected.sum())
         finally:
-            bpy.ops.object.mode_set(mode=mode)
+            profile_operator.end_profile(self, context, profile)
         return { 'FINISHED' }
 
 class TrimNormalsRestoreSavedOperator(bpy.types.Operator):
     bl_idname = 'opr.trim_normals_restore_saved'
     bl_label = 'Restore Saved Selection'
+    bl_description = 'Select the edges of the active edge set'
 
     def execute(self, context): 
-        saved_edges = get_saved_edges(context)
+        run_select_edges_from(self, context, {'SAVED'})
+        return { 'FINISHED' }
 
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.mesh.select_all(action='DESELECT')
+class TrimNormalsSelectEdgeSetsOperator(bpy.types.Operator):
+    bl_idname = 'opr.trim_normals_select_edge_sets'
+    bl_label = 'Select Edge Sets'
+    bl_description = 'Select the union or intersection of the ticked edge sets, or the active set if none are ticked'
+    bl_options = {'REGISTER', 'UNDO'}
 
-        bm = bmesh.from_edit_mesh(context.active_object.data)
-        for e in bm.edges:
-            e.select_set(e.index in saved_edges)
+    combine: bpy.props.EnumProperty(
+        name="Combine",
+        items=[
+            ('OR', "Union", "Select edges in any of the sets"),
+            ('AND', "Intersection", "Select edges in all of the sets"),
+        ],
+        default='OR',
+    )
+
+    def execute(self, context):
+        run_select_edges_from(self, context, {'SETS_' + self.combine})
         return { 'FINISHED' }
 
+class TrimNormalsDetectBevelsOperator(bpy.types.Operator):
+    bl_idname = 'opr.trim_normals_detect_bevels'
+    bl_label = 'Detect Bevel Edges'
+    bl_description = 'Select the edges bounding bevel strips mapped onto the trim sheet\'s bevel band, and save them into the active edge set'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    axis: bpy.props.EnumProperty(
+        name="Band Axis",
+        description="UV axis across the bevel band",
+        items=[
+            ('U', "U", "The bevel band spans a range of U"),
+            ('V', "V", "The bevel band spans a range of V"),
+        ],
+        default='V',
+    )
+
+    band_min: bpy.props.FloatProperty(
+        name="Band Start",
+        description="Lowest UV coordinate of the bevel band",
+        precision=3,
+        step=1,
+        default=0.0,
+    )
+
+    band_max: bpy.props.FloatProperty(
+        name="Band End",
+        description="Highest UV coordinate of the bevel band",
+        precision=3,
+        step=1,
+        default=0.1,
+    )
+
+    min_angle: bpy.props.FloatProperty(
+        name="Min Angle",
+        description="Edges whose polygons meet at less than this angle are left out",
+        subtype='ANGLE',
+        min=0.0,
+        max=math.pi,
+        default=math.radians(10),
+    )
+
+    max_angle: bpy.props.FloatProperty(
+        name="Max Angle",
+        description="Edges whose polygons meet at more than this angle are left out",
+        subtype='ANGLE',
+        min=0.0,
+        max=math.pi,
+        default=math.radians(80),
+    )
+
+    save: bpy.props.BoolProperty(
+        name="Save to Edge Set",
+        description="Save the detected edges into the active edge set",
+        default=True,
+    )
+
+    def execute(self, context):
+        from . import edge_selection
+        profile = profile_operator.begin_profile(context, self.bl_label)
+        try:
+            found = edge_selection.detect_bevel_edges(context, self.axis, (self.band_min, self.band_max),
+                                                      (self.min_angle, self.max_angle), self.save, profile)
+        finally:
+            profile_operator.end_profile(self, context, profile)
+        if found is None:
+            self.report({'WARNING'}, "The mesh has no UV map")
+            return { 'CANCELLED' }
+        self.report({'INFO'}, "Detected {} bevel edges".format(found))
+        return { 'FINISHED' }
+
+class TrimNormalsAddEdgeSetOperator(bpy.types.Operator):
+    bl_idname = 'opr.trim_normals_add_edge_set'
+    bl_label = 'Add Edge Set'
+    bl_description = 'Add an edge set holding the selected edges'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        from . import edge_masks, edge_selection, mesh_io
+        obj = context.active_object
+        mesh = mesh_io.sync_edit_mesh(obj)
+        edge_set = edge_selection.add_edge_set(obj, "Trim {}".format(len(edge_selection.get_edge_sets(obj)) + 1),
+                                               mesh_io.read_selected_edges(mesh))
+        if edge_set is None:
+            self.report({'WARNING'}, "A mesh can hold at most {} edge sets".format(edge_masks.MAX_SETS))
+            return { 'CANCELLED' }
+        return { 'FINISHED' }
+
+class TrimNormalsRemoveEdgeSetOperator(bpy.types.Operator):
+    bl_idname = 'opr.trim_normals_remove_edge_set'
+    bl_label = 'Remove Edge Set'
+    bl_description = 'Remove the active edge set'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.active_object
+        return obj is not None and obj.type == 'MESH' and 0 <= obj.data.trim_normals_edge_set_index < len(obj.data.trim_normals_edge_sets)
+
+    def execute(self, context):
+        from . import edge_selection, mesh_io
+        obj = context.active_object
+        mesh_io.sync_edit_mesh(obj)
+        edge_selection.remove_edge_set(obj, obj.data.trim_normals_edge_set_index)
+        return { 'FINISHED' }
+
+def register():
+    bpy.types.Mesh.trim_normals_edge_sets = bpy.props.CollectionProperty(type=TrimNormalsEdgeSet)
+    bpy.types.Mesh.trim_normals_edge_set_index = bpy.props.IntProperty(name="Active Edge Set")
+
+def unregister():
+    del bpy.types.Mesh.trim_normals_edge_set_index
+    del bpy.types.Mesh.trim_normals_edge_sets